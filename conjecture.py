@@ -1,7 +1,14 @@
+import os
 import sys
 sys.path.append(".") # Needed to pass Sage's automated testing
 
-from sage.all import *
+# Import only what the brain uses rather than all of sage.all, so worker
+# processes that load this module start quickly.
+from sage.calculus.var import function, var
+from sage.functions.other import sqrt
+from sage.graphs.graph import Graph
+from sage.misc.latex import latex
+from sage.structure.sage_object import SageObject
 from inp import INPGraph
 import itertools
 import operator
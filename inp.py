@@ -18,58 +18,1479 @@ AUTHORS:
 #                  http://www.gnu.org/licenses/
 #*****************************************************************************
 
-import cvxopt.base
-import cvxopt.solvers
+import cPickle
+from collections import OrderedDict
 import datetime
 from functools import wraps
-from string import Template
-from itertools import imap
+from itertools import combinations, izip, permutations
 import os
 import re
+import sqlite3
 import subprocess
 import sys
 import time
-import warnings
+import zipfile
+from StringIO import StringIO
 
 from sage.graphs.graph import Graph
 from sage.graphs.graph_generators import graphs
 from sage.rings.integer import Integer
+from sage.rings.integer_ring import ZZ
 from sage.rings.rational import Rational
+from sage.rings.rational_field import QQ
+from sage.rings.real_mpfr import RR
 from sage.functions.other import floor, ceil, sqrt
-from sage.numerical.mip import MixedIntegerLinearProgram
+from sage.misc.misc import SAGE_ROOT
 from sage.misc.package import is_package_installed
-import sage.version
-from sage.combinat.combinat import combinations_iterator
 
 # TODO: Include more functions from survey
 
-try:
-    from progressbar import Bar, Counter, ETA, Percentage, ProgressBar
-    _INPGraph__has_progressbar = True
-except ImportError:
-    _INPGraph__has_progressbar = False
+# Worker processes import this module before evaluating a single graph, so
+# the heavy optional dependencies (cvxopt, numpy, pyarrow, LaTeX export and
+# progressbar) are only imported by the functions that need them.
+
+def _progress_bar(maxval):
+    r"""
+    Return a started progress bar counting up to ``maxval``, or ``None`` if
+    the python-progressbar module is not installed.
+    """
+    try:
+        from progressbar import Bar, Counter, ETA, ProgressBar
+    except ImportError:
+        return None
+    return ProgressBar(widgets=["Testing: ", Counter(), Bar(), ETA()], maxval=maxval, fd=sys.stdout).start()
+
+def _edmonds_matching(adj):
+    r"""
+    Return a maximum matching of the graph with adjacency lists ``adj`` on the
+    vertices ``0, ..., n-1``, as a list ``mate`` where ``mate[v]`` is the
+    vertex matched to ``v``, or -1. This is Edmonds' blossom algorithm.
+    """
+    n = len(adj)
+    mate = [-1] * n
+
+    # Start from a greedy matching; every augmentation adds one edge.
+    for v in range(n):
+        if mate[v] == -1:
+            for w in adj[v]:
+                if mate[w] == -1:
+                    mate[v] = w
+                    mate[w] = v
+                    break
+
+    for root in range(n):
+        if mate[root] != -1:
+            continue
+
+        parent = [-1] * n
+        base = list(range(n))
+        used = [False] * n
+        used[root] = True
+        queue = [root]
+
+        def lca(a, b):
+            seen = [False] * n
+            while True:
+                a = base[a]
+                seen[a] = True
+                if mate[a] == -1:
+                    break
+                a = parent[mate[a]]
+            while True:
+                b = base[b]
+                if seen[b]:
+                    return b
+                b = parent[mate[b]]
+
+        def mark_path(v, b, child, blossom):
+            while base[v] != b:
+                blossom[base[v]] = blossom[base[mate[v]]] = True
+                parent[v] = child
+                child = mate[v]
+                v = parent[mate[v]]
+
+        found = -1
+        i = 0
+        while i < len(queue) and found == -1:
+            v = queue[i]
+            i += 1
+            for w in adj[v]:
+                if base[v] == base[w] or mate[v] == w:
+                    continue
+                if w == root or (mate[w] != -1 and parent[mate[w]] != -1):
+                    b = lca(v, w)
+                    blossom = [False] * n
+                    mark_path(v, b, w, blossom)
+                    mark_path(w, b, v, blossom)
+                    for u in range(n):
+                        if blossom[base[u]]:
+                            base[u] = b
+                            if not used[u]:
+                                used[u] = True
+                                queue.append(u)
+                elif parent[w] == -1:
+                    parent[w] = v
+                    if mate[w] == -1:
+                        found = w
+                        break
+                    used[mate[w]] = True
+                    queue.append(mate[w])
+
+        v = found
+        while v != -1:
+            pv = parent[v]
+            ppv = mate[pv]
+            mate[v] = pv
+            mate[pv] = v
+            v = ppv
+
+    return mate
+
+def _hopcroft_karp(adj, num_right, mate_left=None, mate_right=None, left_alive=None, right_alive=None):
+    r"""
+    Return a maximum matching ``(mate_left, mate_right)`` of the bipartite
+    graph where left vertex ``u`` is adjacent to the right vertices
+    ``adj[u]``. This is the Hopcroft-Karp algorithm.
+
+    A partial matching given in ``mate_left`` and ``mate_right`` is extended
+    in place, so a matching broken by deleting vertices is repaired with only
+    as many augmentations as edges were lost. Vertices with a false entry in
+    ``left_alive`` or ``right_alive`` are treated as deleted.
+    """
+    num_left = len(adj)
+    if mate_left is None:
+        mate_left = [-1] * num_left
+    if mate_right is None:
+        mate_right = [-1] * num_right
+
+    while True:
+        # Layer the left vertices by alternating distance from the free ones.
+        dist = [-1] * num_left
+        free = [u for u in range(num_left) if mate_left[u] == -1 and (left_alive is None or left_alive[u])]
+        for u in free:
+            dist[u] = 0
+        queue = list(free)
+        found = False
+        i = 0
+        while i < len(queue):
+            u = queue[i]
+            i += 1
+            for v in adj[u]:
+                if right_alive is not None and not right_alive[v]:
+                    continue
+                w = mate_right[v]
+                if w == -1:
+                    found = True
+                elif dist[w] == -1:
+                    dist[w] = dist[u] + 1
+                    queue.append(w)
+
+        if not found:
+            return (mate_left, mate_right)
+
+        # Augment along vertex-disjoint shortest paths, using an explicit
+        # stack so long paths do not hit the recursion limit.
+        pos = [0] * num_left
+        for root in free:
+            stack = [root]
+            via = []
+            while stack:
+                x = stack[-1]
+                advanced = False
+                while pos[x] < len(adj[x]):
+                    v = adj[x][pos[x]]
+                    pos[x] += 1
+                    if right_alive is not None and not right_alive[v]:
+                        continue
+                    w = mate_right[v]
+                    if w == -1:
+                        via.append(v)
+                        for (y, r) in zip(stack, via):
+                            mate_left[y] = r
+                            mate_right[r] = y
+                        for y in stack:
+                            dist[y] = -1
+                        stack = []
+                        advanced = True
+                        break
+                    elif dist[w] == dist[x] + 1:
+                        via.append(v)
+                        stack.append(w)
+                        advanced = True
+                        break
+                if not advanced:
+                    dist[x] = -1
+                    stack.pop()
+                    if via:
+                        via.pop()
+
+def _has_anti_triangle(masks, subset):
+    r"""
+    Return True if the vertices in the bitset ``subset`` include three that
+    are pairwise non-adjacent, for the neighbourhood bitsets ``masks``.
+    """
+    rest = subset
+    while rest:
+        low = rest & -rest
+        rest ^= low
+        u = low.bit_length() - 1
+        # Non-neighbours of u among the later vertices of the subset.
+        later = rest & ~masks[u]
+        while later:
+            bit = later & -later
+            later ^= bit
+            if later & ~masks[bit.bit_length() - 1]:
+                return True
+    return False
+
+def _has_odd_hole(masks):
+    r"""
+    Return True if the graph with neighbourhood bitsets ``masks`` has an odd
+    hole, that is, an induced cycle of odd length at least five.
+
+    The induced paths starting at each vertex `s` and running through larger
+    vertices are grown depth first. The next vertex must be adjacent to the
+    end of the path and to no other path vertex except possibly `s`; if it is
+    adjacent to `s` it closes an induced cycle instead of extending the path.
+    """
+    n = len(masks)
+    for s in xrange(n - 4):
+        # Vertices up to s, the path itself and the neighbours of its
+        # interior vertices cannot extend the path.
+        below = (1 << (s + 1)) - 1
+        rest = masks[s] & ~below
+        stack = []
+        while rest:
+            low = rest & -rest
+            rest ^= low
+            stack.append((low.bit_length() - 1, below | low, 2))
+
+        while stack:
+            (last, blocked, length) = stack.pop()
+            candidates = masks[last] & ~blocked
+            if length % 2 == 0 and length >= 4 and candidates & masks[s]:
+                return True
+
+            rest = candidates & ~masks[s]
+            blocked |= masks[last]
+            while rest:
+                low = rest & -rest
+                rest ^= low
+                stack.append((low.bit_length() - 1, blocked | low, length + 1))
+    return False
+
+def _maximum_independent_set(masks, lower=0, upper=None, candidates=None):
+    r"""
+    Return ``(size, subset)`` for a maximum independent set of the graph with
+    neighbourhood bitsets ``masks``, found by branch and bound, or
+    ``(lower, None)`` if there is no independent set larger than ``lower``.
+    With the bitset ``candidates``, only the subgraph it induces is searched.
+
+    Each node covers its candidate bitset greedily by cliques of the graph,
+    which is a colouring of the complement; an independent set takes at most
+    one vertex of each clique, so the number of cliques bounds how much the
+    current set can still grow. Candidates are branched on from the last
+    clique back, and a branch is cut when its bound cannot beat the best set
+    so far. The search stops as soon as it finds a set of size ``upper``.
+    """
+    n = len(masks)
+    everything = (1 << n) - 1
+    others = [everything & ~masks[v] & ~(1 << v) for v in xrange(n)]
+    if upper is None:
+        upper = n
+
+    best = [lower, None]
+
+    def cover(candidates):
+        # Vertices in branching order, each with the number of cliques up to
+        # and including its own.
+        order = []
+        count = 0
+        while candidates:
+            count += 1
+            clique = candidates
+            while clique:
+                low = clique & -clique
+                clique &= masks[low.bit_length() - 1]
+                candidates ^= low
+                order.append((low, count))
+        return order
+
+    def expand(size, current, candidates):
+        order = cover(candidates)
+        for (bit, bound) in reversed(order):
+            if size + bound <= best[0]:
+                return False
+            v = bit.bit_length() - 1
+            remaining = candidates & others[v]
+            if remaining:
+                if expand(size + 1, current | bit, remaining):
+                    return True
+            elif size + 1 > best[0]:
+                best[0] = size + 1
+                best[1] = current | bit
+                if best[0] >= upper:
+                    return True
+            candidates ^= bit
+        return False
+
+    start = everything if candidates is None else candidates
+    if start:
+        expand(0, 0, start)
+    return (best[0], best[1])
+
+def _critical_independent_set(adj, mate_left, mate_right, alive=None):
+    r"""
+    Return the indices of a critical independent set, from a maximum
+    matching ``(mate_left, mate_right)`` of the bipartite double cover of the
+    graph with adjacency lists ``adj``, restricted to the vertices with a true
+    entry in ``alive`` on both sides.
+
+    The left vertices reachable from free left vertices by alternating paths
+    form the left half `X` of a maximum independent set of the double cover
+    (Konig), so `X` maximizes `|X| - |N(X)|` and `X \setminus N(X)` is a
+    critical independent set (Larson 2007).
+    """
+    n = len(adj)
+    if alive is None:
+        alive = [True] * n
+
+    reached = [alive[u] and mate_left[u] == -1 for u in xrange(n)]
+    stack = [u for u in xrange(n) if reached[u]]
+    while stack:
+        u = stack.pop()
+        for v in adj[u]:
+            if not alive[v]:
+                continue
+            w = mate_right[v]
+            if w != -1 and not reached[w]:
+                reached[w] = True
+                stack.append(w)
+
+    X = [u for u in xrange(n) if reached[u]]
+    covered = set()
+    for u in X:
+        covered.update(v for v in adj[u] if alive[v])
+    return [u for u in X if u not in covered]
+
+def _inertia(adj, shift=0):
+    r"""
+    Return the numbers ``(positive, negative, zero)`` of positive, negative
+    and zero eigenvalues of `A - shift \cdot I`, for the adjacency matrix `A`
+    of the graph with adjacency lists ``adj``, computed exactly without any
+    eigenvalues.
+
+    By Sylvester's law of inertia a congruence `P^T A P` keeps these counts.
+    Symmetric Gaussian elimination over the rationals splits off a nonzero
+    diagonal entry, which counts by its sign, or, when the whole remaining
+    diagonal is zero, a block `\begin{pmatrix} 0 & a \\ a & 0 \end{pmatrix}`,
+    which has one eigenvalue of each sign. What is left at the end is zero.
+    Rows are kept sparse, as dictionaries of their nonzero entries.
+    """
+    n = len(adj)
+    rows = [dict((j, Integer(1)) for j in neighbors) for neighbors in adj]
+    if shift:
+        for (i, row) in enumerate(rows):
+            row[i] = -Integer(shift)
+    alive = set(xrange(n))
+    positive = 0
+    negative = 0
+
+    def update(k, l, delta):
+        value = rows[k].get(l, 0) + delta
+        if value:
+            rows[k][l] = value
+        else:
+            rows[k].pop(l, None)
+
+    def remove(pivots):
+        for p in pivots:
+            alive.discard(p)
+        for p in pivots:
+            for k in rows[p]:
+                if k in alive:
+                    for q in pivots:
+                        rows[k].pop(q, None)
+
+    while alive:
+        pivot = next((i for i in alive if rows[i].get(i, 0)), None)
+        if pivot is not None:
+            d = rows[pivot][pivot]
+            if d > 0:
+                positive += 1
+            else:
+                negative += 1
+            others = [(k, b) for (k, b) in rows[pivot].iteritems() if k != pivot]
+            for (k, b) in others:
+                factor = b / d
+                for (l, c) in others:
+                    update(k, l, -factor * c)
+            remove([pivot])
+            continue
+
+        i = next((i for i in alive if rows[i]), None)
+        if i is None:
+            break
+        j = next(iter(rows[i]))
+        a = rows[i][j]
+        positive += 1
+        negative += 1
+        # The Schur complement of [[0, a], [a, 0]] subtracts
+        # (r_i r_j^T + r_j r_i^T) / a.
+        row_i = [(k, b) for (k, b) in rows[i].iteritems() if k != i and k != j]
+        row_j = [(k, b) for (k, b) in rows[j].iteritems() if k != i and k != j]
+        for (k, b) in row_i:
+            for (l, c) in row_j:
+                update(k, l, -b * c / a)
+                update(l, k, -b * c / a)
+        remove([i, j])
+
+    return (positive, negative, n - positive - negative)
+
+def _spectral_radius_bound(adj):
+    r"""
+    Return an upper bound on the largest adjacency eigenvalue of the graph
+    with adjacency lists ``adj``, for graphs too large for a dense
+    eigensolver. It is an ``Integer`` when it is the maximum degree.
+
+    Lanczos iteration gives an approximate Perron vector `x`, taken
+    entrywise positive. By the Collatz-Wielandt formula `\lambda_1 \leq
+    \max_i (Ax)_i / x_i` for every positive `x`, however inaccurate, so the
+    approximation only costs sharpness. The maximum degree is a bound too,
+    and is used when Lanczos does not converge.
+    """
+    import numpy
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.linalg import ArpackNoConvergence, eigsh
+
+    n = len(adj)
+    max_degree = max(len(neighbors) for neighbors in adj)
+    if n < 3 or max_degree == 0:
+        return Integer(max_degree)
+
+    indptr = numpy.cumsum([0] + [len(neighbors) for neighbors in adj])
+    indices = numpy.array([w for neighbors in adj for w in neighbors])
+    A = csr_matrix((numpy.ones(len(indices)), indices, indptr), shape=(n, n))
+
+    try:
+        (values, vectors) = eigsh(A, k=1, which='LA', v0=numpy.ones(n))
+    except ArpackNoConvergence:
+        return Integer(max_degree)
+
+    x = numpy.abs(vectors[:, 0])
+    x = numpy.maximum(x, 1e-9 * x.max())
+    # The margin covers the rounding in the products and quotients.
+    bound = float((A.dot(x) / x).max()) * (1 + 1e-12)
+    if bound >= max_degree:
+        return Integer(max_degree)
+    return bound
+
+def _linear_memory(n, m):
+    r"""
+    Estimate the bytes taken by a bound that needs only the adjacency lists
+    and a few vertex indexed lists of Python integers, for a graph with
+    ``n`` vertices and ``m`` edges.
+    """
+    return 64 * (n + 2 * m)
+
+def _drops_instance_cache(method):
+    r"""
+    Wrap the graph mutator ``method`` so that it drops the cache of
+    :meth:`INPGraph._instance_cache`, which can only tell changes of order
+    and size apart by itself.
+    """
+    @wraps(method)
+    def mutator(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.__dict__.pop('_inp_cache', None)
+    return mutator
+
+def _induced_pattern_tables(patterns):
+    r"""
+    Return ``{k: {mask: names}}`` for the ``(name, graph)`` pairs in
+    ``patterns``, where ``mask`` runs over the edge bitmasks of every
+    labelling of a pattern on `k` vertices by ``0, ..., k-1``. Bit ``p`` of a
+    mask stands for the ``p``-th pair of ``combinations(range(k), 2)``.
+    """
+    tables = {}
+    for (name, g) in patterns:
+        verts = g.vertices()
+        k = len(verts)
+        pairs = list(combinations(range(k), 2))
+        edges = set((verts.index(u), verts.index(v)) for (u, v) in g.edge_iterator(labels=False))
+        edges.update((b, a) for (a, b) in list(edges))
+
+        table = tables.setdefault(k, {})
+        for perm in permutations(range(k)):
+            mask = sum(1 << p for (p, (a, b)) in enumerate(pairs) if (perm[a], perm[b]) in edges)
+            if name not in table.get(mask, ()):
+                table[mask] = table.get(mask, ()) + (name,)
+    return tables
+
+def _cvxopt_sdp():
+    r"""
+    Return cvxopt's base and solvers modules, importing them and setting the
+    SDP solver options on first use.
+    """
+    import cvxopt.base
+    import cvxopt.solvers
+
+    if not getattr(_cvxopt_sdp, '_configured', False):
+        cvxopt.solvers.options['show_progress'] = False
+        cvxopt.solvers.options['abstol'] = float(1e-10)
+        cvxopt.solvers.options['reltol'] = float(1e-10)
+        _cvxopt_sdp._configured = True
+
+    return (cvxopt.base, cvxopt.solvers)
+
+def _lovasz_theta_sdp(A, vertex_orbits, nonedge_orbits):
+    r"""
+    Return certified bounds ``(lower, upper)`` on
+    `\vartheta = \max \langle J, X \rangle` over positive semidefinite
+    `n \times n` matrices `X` with trace 1 and `X_{ij} = 0` for every edge
+    `ij` of the graph with 0/1 adjacency matrix ``A`` (a NumPy array), solved
+    with cvxopt.
+
+    The optimum can be averaged over the automorphism group, so `X` is taken
+    constant on the diagonal of each orbit in ``vertex_orbits`` (lists of
+    vertex indices) and on each orbit in ``nonedge_orbits`` (lists of index
+    pairs ``(i, j)`` with ``i > j``). With singleton orbits this is the full
+    SDP. The trace condition eliminates the variable of the last vertex orbit.
+    """
+    import numpy
+
+    (base, solvers) = _cvxopt_sdp()
+
+    n = A.shape[0]
+    last = vertex_orbits[-1]
+    rows = []
+    cols = []
+    vals = []
+    c = []
+
+    # X = D_last/|last| + sum y_O (D_O - |O|/|last| D_last) + sum z_P E_P, and
+    # cvxopt wants h - sum x_k G_k, so each column holds -vec(A_k). Only the
+    # lower triangle is used.
+    for orbit in vertex_orbits[:-1]:
+        ratio = float(len(orbit)) / len(last)
+        for i in orbit:
+            rows.append(i * (n + 1))
+            cols.append(len(c))
+            vals.append(-1.0)
+        for i in last:
+            rows.append(i * (n + 1))
+            cols.append(len(c))
+            vals.append(ratio)
+        c.append(0.0)
+
+    for orbit in nonedge_orbits:
+        for (i, j) in orbit:
+            rows.append(i + j * n)
+            cols.append(len(c))
+            vals.append(-1.0)
+        c.append(-2.0 * len(orbit))
+
+    # With no free variables X = D_last/|last| and the value is its trace.
+    if not c:
+        return (1.0, 1.0)
+
+    h = [0.0] * (n * n)
+    for i in last:
+        h[i * (n + 1)] = 1.0 / len(last)
+
+    G = base.spmatrix(vals, rows, cols, (n * n, len(c)))
+    c = base.matrix(c)
+    sol = solvers.sdp(c, Gs=[G], hs=[base.matrix(h, (n, n))])
+
+    # The slack is X itself, and the dual matrix is Z = sI - M for the
+    # matrix M of the dual problem, so M agrees with -Z on the edges.
+    # cvxopt only fills the lower triangles.
+    X = numpy.tril(numpy.array(sol['ss'][0]))
+    Z = numpy.tril(numpy.array(sol['zs'][0]))
+    return _lovasz_theta_certificate(A, X + numpy.tril(X, -1).T, -(Z + numpy.tril(Z, -1).T))
+
+def _lovasz_theta_admm(A, tolerance=1e-7, max_iterations=10000, check_interval=20):
+    r"""
+    Return certified bounds ``(lower, upper)`` on the Lovasz theta of the graph
+    with 0/1 adjacency matrix ``A`` (a NumPy array), computed with ADMM.
+
+    ADMM splits `\max \langle J, X \rangle` over `tr X = 1`, `X_{ij} = 0` on
+    edges and `X \succeq 0` into a projection onto the affine constraints and a
+    projection onto the positive semidefinite cone. Only a few `n \times n`
+    matrices are kept, so memory is `O(n^2)` however many edges there are.
+    Iteration stops once the certified gap is below ``tolerance`` relative to
+    theta, or after ``max_iterations`` with whatever bounds were certified.
+    """
+    import numpy
+
+    n = A.shape[0]
+    edges = A != 0
+    J = numpy.ones((n, n))
+    # A fixed penalty of n^2/10 converged fastest on random graphs of 25 to
+    # 150 vertices; residual balancing did worse.
+    rho = n * n / 10.0
+
+    Y = numpy.eye(n) / n
+    U = numpy.zeros((n, n))
+    (lower, upper) = (1.0, float(n))
+
+    for iteration in xrange(1, max_iterations + 1):
+        X = Y - U + J / rho
+        X[edges] = 0.0
+        X[numpy.diag_indices(n)] += (1.0 - numpy.trace(X)) / n
+
+        (w, V) = numpy.linalg.eigh(X + U)
+        Y = (V * numpy.maximum(w, 0.0)).dot(V.T)
+        U += X - Y
+
+        if iteration % check_interval == 0 or iteration == max_iterations:
+            (new_lower, new_upper) = _lovasz_theta_certificate(A, Y, rho * U)
+            lower = max(lower, new_lower)
+            upper = min(upper, new_upper)
+            if upper - lower <= tolerance * upper:
+                break
+
+    return (lower, upper)
+
+def _lovasz_theta_certificate(A, X, M):
+    r"""
+    Return certified bounds ``(lower, upper)`` on the Lovasz theta of the graph
+    with 0/1 adjacency matrix ``A`` (a NumPy array), from approximate solutions
+    ``X`` and ``M`` of the primal and dual SDP.
+
+    ``X`` gives a lower bound once its edge entries are zeroed and it is
+    shifted by the smallest multiple of the identity making it positive
+    semidefinite, since `\vartheta \geq \langle J, X \rangle / tr X` for every
+    such matrix. ``M`` gives the upper bound `\lambda_{max}(M)` once its
+    diagonal and non-edge entries are set to 1. Both are widened by a margin
+    covering the floating point error of the eigenvalue computations.
+    """
+    import numpy
+
+    n = A.shape[0]
+    edges = A != 0
+    margin = 1e-9 * n
+
+    X = (X + X.T) / 2
+    X[edges] = 0.0
+    shift = max(0.0, -numpy.linalg.eigvalsh(X)[0])
+    trace = numpy.trace(X) + n * shift
+    if trace > 0:
+        lower = (X.sum() + n * shift) / trace - margin
+    else:
+        lower = 1.0
+
+    M = numpy.where(edges, (M + M.T) / 2, 1.0)
+    upper = numpy.linalg.eigvalsh(M)[-1] + margin
+
+    return (max(lower, 1.0), min(upper, float(n)))
+
+class SurveyResults(object):
+    r"""
+    A persistent store of survey values, keyed by graph6 string and by
+    the module and qualified name of the function. Values of lambdas are
+    never stored, since all of them share the name ``<lambda>``.
+
+    Each value is stamped with the ``_version`` attribute of the function that
+    computed it (1 if the function has none). A stored value is only reused
+    while the function keeps that version, so bumping ``_version`` after
+    changing a bound forces it to be recomputed on the next survey.
+
+    A ``None`` value records that the function raised ``ValueError``.
+
+    EXAMPLES:
+
+    ::
+        sage: def bound(g):
+        ...       return g.order()
+        sage: results = SurveyResults(':memory:')
+        sage: results.fetch('Bw', bound)
+        (False, None)
+        sage: results.record('Bw', bound, 3)
+        sage: results.fetch('Bw', bound)
+        (True, 3)
+        sage: bound._version = 2
+        sage: results.fetch('Bw', bound)
+        (False, None)
+        sage: SurveyResults.function_key(INPGraph.caro_wei).endswith('.INPGraph.caro_wei')
+        True
+        sage: SurveyResults.function_key(INPGraph._lower_bounds[0]) == SurveyResults.function_key(INPGraph.angel_campigotto_laforest)
+        True
+        sage: results.record('Bw', lambda g: 0, 0)
+        sage: results.fetch('Bw', lambda g: 1)
+        (False, None)
+    """
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS results ("
+                                 "graph TEXT NOT NULL, function TEXT NOT NULL, "
+                                 "version INTEGER NOT NULL, value BLOB, "
+                                 "PRIMARY KEY (graph, function))")
+        self._connection.commit()
+
+    @staticmethod
+    def version(func):
+        return getattr(func, '_version', 1)
+
+    @staticmethod
+    def function_key(func):
+        r"""
+        Return the module and qualified name of ``func``, under which its
+        values are stored, or ``None`` for a lambda, whose name says nothing
+        about what it computes.
+        """
+        owner = getattr(func, 'im_class', None)
+        func = getattr(func, 'im_func', func)
+        name = func.__name__
+        if name == '<lambda>':
+            return None
+        if owner is None and INPGraph.__dict__.get(name) is func:
+            owner = INPGraph
+        if owner is not None:
+            name = '{0}.{1}'.format(owner.__name__, name)
+        return '{0}.{1}'.format(func.__module__, name)
+
+    def fetch(self, key, func):
+        function_key = self.function_key(func)
+        if function_key is None:
+            return (False, None)
+        row = self._connection.execute("SELECT version, value FROM results "
+                                       "WHERE graph = ? AND function = ?",
+                                       (key, function_key)).fetchone()
+        if row is None or row[0] != self.version(func):
+            return (False, None)
+        if row[1] is None:
+            return (True, None)
+        return (True, cPickle.loads(str(row[1])))
+
+    def record(self, key, func, value):
+        function_key = self.function_key(func)
+        if function_key is None:
+            return
+        if value is not None:
+            value = sqlite3.Binary(cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL))
+        self._connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                                 (key, function_key, self.version(func), value))
+
+    def commit(self):
+        self._connection.commit()
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
+
+class SurveyWriter(object):
+    r"""
+    Stream per-graph survey values into a compressed columnar file.
+
+    Each row holds the graph6 string of a graph, its independence number and
+    the value of every surveyed function. Rows are buffered and written out in
+    row groups of ``row_group_size`` rows, so memory stays flat however many
+    graphs are surveyed.
+
+    If ``path`` ends in ``.parquet`` the file is written with pyarrow, one
+    Parquet row group at a time. Otherwise it is a chunked NPZ file: a zip
+    archive holding one compressed ``<column>.<group>.npy`` array per column
+    and row group, readable with :meth:`load`.
+
+    Alpha properties are stored as ``int8`` (1, 0, or -1 when undefined) and
+    bounds as ``float64`` (``nan`` when undefined). Each function's column is
+    named by :meth:`SurveyResults.function_key`, so functions sharing a name
+    do not clash. A lambda has no such key and gets ``<lambda>`` followed by
+    its position in ``funcs``.
+
+    EXAMPLES:
+
+    ::
+        sage: import tempfile
+        sage: path = tempfile.mktemp(suffix='.npz')
+        sage: funcs = [INPGraph.has_pendant_vertex, INPGraph.caro_wei]
+        sage: writer = SurveyWriter(path, funcs, row_group_size=2)
+        sage: for s in ['Bw', 'Bo', 'C~']:
+        ...       g = INPGraph(s)
+        ...       writer.write(s, g.alpha(), dict((f, f(g)) for f in funcs))
+        sage: writer.close()
+        sage: columns = SurveyWriter.load(path)
+        sage: list(columns['graph6'])
+        ['Bw', 'Bo', 'C~']
+        sage: list(columns[SurveyResults.function_key(INPGraph.has_pendant_vertex)])
+        [0, 1, 0]
+        sage: columns[SurveyResults.function_key(INPGraph.caro_wei)][2]
+        1.0
+    """
+    def __init__(self, path, funcs, row_group_size=10000):
+        self.path = path
+        self.funcs = list(funcs)
+        self.row_group_size = row_group_size
+        self.columns = ['graph6', 'alpha'] + [self._column(i, f) for (i, f) in enumerate(self.funcs)]
+        self._rows = []
+        self._group = 0
+
+        if path.endswith('.parquet'):
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise TypeError, "The pyarrow package is required to write Parquet survey output."
+            self._pyarrow = pyarrow
+            self._parquet = None
+            self._zip = None
+        else:
+            self._pyarrow = None
+            self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True)
+
+    @staticmethod
+    def _column(position, func):
+        key = SurveyResults.function_key(func)
+        if key is None:
+            return '<lambda>{0}'.format(position)
+        return key
+
+    def _dtype(self, func):
+        import numpy
+        if INPGraph._function_kind(func) == 'alpha_property':
+            return numpy.int8
+        return numpy.float64
+
+    def _convert(self, func, value):
+        import numpy
+        if INPGraph._function_kind(func) == 'alpha_property':
+            return -1 if value is None else int(bool(value))
+        return numpy.nan if value is None else float(value)
+
+    def write(self, graph6, alpha, values):
+        r"""
+        Add a row. ``values`` maps each surveyed function to its value, or to
+        ``None`` when the function is not defined for the graph.
+        """
+        self._rows.append([graph6, -1 if alpha is None else int(alpha)] +
+                          [self._convert(f, values.get(f)) for f in self.funcs])
+        if len(self._rows) >= self.row_group_size:
+            self.flush()
+
+    def _arrays(self):
+        import numpy
+        cols = zip(*self._rows)
+        arrays = [numpy.array(cols[0], dtype=str), numpy.array(cols[1], dtype=numpy.int16)]
+        for f, col in zip(self.funcs, cols[2:]):
+            arrays.append(numpy.array(col, dtype=self._dtype(f)))
+        return arrays
+
+    def flush(self):
+        r"""
+        Write the buffered rows out as one row group.
+        """
+        if not self._rows:
+            return
+
+        import numpy
+        arrays = self._arrays()
+
+        if self._pyarrow is not None:
+            table = self._pyarrow.Table.from_arrays([self._pyarrow.array(a) for a in arrays], self.columns)
+            if self._parquet is None:
+                self._parquet = self._pyarrow.parquet.ParquetWriter(self.path, table.schema, compression='snappy')
+            self._parquet.write_table(table)
+        else:
+            for name, a in zip(self.columns, arrays):
+                buf = StringIO()
+                numpy.lib.format.write_array(buf, a)
+                self._zip.writestr("{0}.{1:05d}.npy".format(name, self._group), buf.getvalue())
+
+        self._group += 1
+        self._rows = []
+
+    def close(self):
+        self.flush()
+        if self._pyarrow is not None:
+            if self._parquet is not None:
+                self._parquet.close()
+        else:
+            self._zip.close()
+
+    @classmethod
+    def load(cls, path):
+        r"""
+        Return a dictionary mapping each column of a chunked NPZ survey file
+        to a single array holding all of its row groups.
+        """
+        import numpy
+        chunks = {}
+        npz = numpy.load(path)
+        try:
+            # Group numbers are zero padded to five digits only, so sort
+            # them as numbers.
+            for name in sorted(npz.files, key=lambda name: int(name.rsplit('.', 1)[1])):
+                (column, group) = name.rsplit('.', 1)
+                chunks.setdefault(column, []).append(npz[name])
+        finally:
+            npz.close()
+        return dict((column, numpy.concatenate(arrays)) for (column, arrays) in chunks.iteritems())
+
+class DifficultGraphs(object):
+    r"""
+    An append-only store of difficult graphs.
+
+    Graphs are keyed by the graph6 string of their canonical labeling, so
+    isomorphic copies are only stored once, and indexed by order, size and
+    bound gap ``floor(best_upper_bound) - ceil(best_lower_bound)``.
+
+    The store is an SQLite database in WAL mode. Parallel workers should each
+    open their own ``DifficultGraphs`` on the same path; concurrent writers
+    wait for each other for up to ``timeout`` seconds.
+
+    EXAMPLES:
+
+    ::
+        sage: store = DifficultGraphs(':memory:')
+        sage: g = INPGraph(graphs.PetersenGraph())
+        sage: g in store
+        False
+        sage: store.add(g)
+        True
+        sage: h = INPGraph(g.relabel(range(9, -1, -1), inplace=False))
+        sage: h in store
+        True
+        sage: store.add(h)
+        False
+        sage: len(store)
+        1
+        sage: [x.is_isomorphic(g) for x in store.query(order=10, size=15)]
+        [True]
+    """
+    def __init__(self, path, timeout=60.0):
+        self._connection = sqlite3.connect(path, timeout=timeout)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS graphs ("
+                                 "canonical TEXT PRIMARY KEY, graph6 TEXT NOT NULL, "
+                                 "vertices INTEGER NOT NULL, edges INTEGER NOT NULL, "
+                                 "gap INTEGER NOT NULL, found TEXT NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS graphs_vertices ON graphs (vertices)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS graphs_edges ON graphs (edges)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS graphs_gap ON graphs (gap)")
+        self._connection.commit()
+
+    @staticmethod
+    def canonical_key(g):
+        return g.canonical_label().graph6_string()
+
+    @staticmethod
+    def row(g):
+        r"""
+        Return the row stored for ``g``. Workers may build rows themselves and
+        hand them to :meth:`add_rows`, keeping the bound computations out of
+        the writing process.
+        """
+        gap = floor(g.best_upper_bound()) - ceil(g.best_lower_bound())
+        return (DifficultGraphs.canonical_key(g), g.graph6_string(), int(g.order()),
+                int(g.size()), int(gap), datetime.datetime.now().isoformat())
+
+    def add_rows(self, rows):
+        r"""
+        Insert rows built by :meth:`row` in one transaction, skipping graphs
+        that are already stored. Returns the number of new graphs.
+        """
+        with self._connection:
+            before = self._connection.total_changes
+            self._connection.executemany("INSERT OR IGNORE INTO graphs VALUES (?, ?, ?, ?, ?, ?)", rows)
+            return self._connection.total_changes - before
+
+    def add_many(self, graphs):
+        return self.add_rows([self.row(g) for g in graphs if g not in self])
+
+    def add(self, g):
+        r"""
+        Store ``g``. Returns False if an isomorphic graph was already stored.
+        """
+        return self.add_many([g]) == 1
+
+    def __contains__(self, g):
+        return self._connection.execute("SELECT 1 FROM graphs WHERE canonical = ?",
+                                        (self.canonical_key(g),)).fetchone() is not None
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM graphs").fetchone()[0]
+
+    def __iter__(self):
+        return self.query()
+
+    def query(self, order=None, size=None, min_gap=None):
+        r"""
+        Iterate over the stored graphs with the given order and size and a
+        bound gap of at least ``min_gap``, smallest first.
+        """
+        conditions = []
+        params = []
+        for (column, op, value) in [('vertices', '=', order), ('edges', '=', size), ('gap', '>=', min_gap)]:
+            if value is not None:
+                conditions.append("{0} {1} ?".format(column, op))
+                params.append(value)
+
+        sql = "SELECT graph6 FROM graphs"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY vertices, edges, canonical"
+
+        for (graph6,) in self._connection.execute(sql, params):
+            yield INPGraph(str(graph6))
+
+    def close(self):
+        self._connection.close()
 
 class INPGraph(Graph):
     _nauty_count_pattern = re.compile(r'>Z (\d+) graphs generated')
     _save_path = os.path.expanduser("~/Dropbox/INP")
+    _survey_path = os.path.join(_save_path, "survey.sqlite")
+    _difficult_graphs_path = os.path.join(_save_path, "difficult_graphs.sqlite")
+    _survey_commit_interval = 1000
+    # Canonical forms are only worth computing when graphs repeat, so this
+    # cache is opt-in and keeps the _lovasz_theta_cache_size latest entries.
+    _lovasz_theta_cache = OrderedDict()
+    _lovasz_theta_cache_size = 10000
+    # Graphs of larger order go to ADMM rather than the interior point solver.
+    _lovasz_theta_admm_order = 40
+    # Floating point values this close to an integer are checked exactly.
+    _float_tolerance = 1e-6
+    _spectral_batch_size = 256
+    _induced_patterns = {}
+    # Graphs of larger order only get the bounds that avoid quadratic memory,
+    # and only those estimated to fit in _large_graph_memory bytes.
+    _large_graph_order = 2000
+    _large_graph_memory = 2**30
 
     def memoize_graphs(func):
         func._cache = {}
+        name = func.__name__
         @wraps(func)
         def memo(g):
+            # The graph6 string of a large graph is quadratic in its order.
+            if g.order() > g._large_graph_order:
+                cache = g._instance_cache()
+                if name not in cache:
+                    cache[name] = func(g)
+                return cache[name]
             key = g.graph6_string()
             if key not in func._cache:
                 func._cache[key] = func(g)
             return func._cache[key]
         return memo
 
+    def memoize_instance(func):
+        r"""
+        Cache the result of ``func`` on the graph object itself. Use this
+        rather than memoize_graphs for results that refer to vertex labels.
+        The cache is dropped by the mutators wrapped at the end of this
+        module, and whenever the order or size of the graph changes.
+        """
+        name = func.__name__
+        @wraps(func)
+        def memo(g):
+            cache = g._instance_cache()
+            if name not in cache:
+                cache[name] = func(g)
+            return cache[name]
+        return memo
+
     def __init__(self, *args, **kwargs):
         Graph.__init__(self, *args, **kwargs)
 
+    def _instance_cache(self):
+        r"""
+        Return the dictionary behind memoize_instance for this graph.
+
+        EXAMPLES:
+
+        Mutators drop it even when the order and size stay the same ::
+            sage: G = INPGraph(graphs.StarGraph(3))
+            sage: G.alpha()
+            3
+            sage: G.delete_edge(0, 1)
+            sage: G.add_edge(1, 2)
+            sage: G.alpha()
+            2
+        """
+        signature = (self.order(), self.size())
+        if self.__dict__.get('_shares_backend'):
+            # The other graph on the backend can change it behind our back.
+            signature = (frozenset(self.vertex_iterator()), frozenset(self.edge_iterator(labels=False)))
+        cache = self.__dict__.get('_inp_cache')
+        if cache is None or cache[0] != signature:
+            cache = (signature, {})
+            self._inp_cache = cache
+        return cache[1]
+
+    @memoize_instance
+    def _vertex_list(self):
+        return self.vertices()
+
+    @memoize_instance
+    def _vertex_index(self):
+        return dict((v, i) for (i, v) in enumerate(self._vertex_list()))
+
+    @memoize_instance
+    def _adjacency_lists(self):
+        r"""
+        Return the adjacency lists of the graph with the vertices numbered by
+        their position in :meth:`_vertex_list`.
+        """
+        index = self._vertex_index()
+        return [[index[w] for w in self.neighbor_iterator(v)] for v in self._vertex_list()]
+
+    @memoize_instance
+    def _adjacency_inertia(self):
+        r"""
+        Return the numbers of positive, negative and zero eigenvalues of the
+        adjacency matrix, computed exactly by :func:`_inertia`.
+        """
+        return _inertia(self._adjacency_lists())
+
+    @memoize_instance
+    def _largest_eigenvalue(self):
+        r"""
+        Return the largest adjacency eigenvalue, as an ``Integer`` when it is
+        an integer and as a float otherwise. Above ``_large_graph_order``
+        vertices this is the upper bound of :func:`_spectral_radius_bound`
+        instead, which is all that :meth:`wilf` needs.
+        """
+        if self.order() > self._large_graph_order:
+            try:
+                return _spectral_radius_bound(self._adjacency_lists())
+            except ImportError:
+                raise ValueError, "The scipy package is required for the spectral radius of a large graph."
+
+        import numpy
+        return self._record_spectrum(numpy.linalg.eigvalsh(self._adjacency_array()))
+
+    def _record_spectrum(self, eigenvalues):
+        r"""
+        Take the increasing floating point adjacency ``eigenvalues`` and
+        return the largest one as :meth:`_largest_eigenvalue` does. Also seed
+        the cache of :meth:`_adjacency_inertia` unless some eigenvalue is
+        close enough to zero that only the exact computation can tell.
+
+        The largest eigenvalue is an algebraic integer, so it is either an
+        integer or irrational. One within ``_float_tolerance`` of an
+        integer `k` is checked exactly: `k` is the largest eigenvalue if and
+        only if `A - kI` has no positive and some zero eigenvalues.
+        """
+        largest = float(eigenvalues[-1])
+        k = int(round(largest))
+        if abs(largest - k) < self._float_tolerance:
+            (positive, negative, zero) = _inertia(self._adjacency_lists(), k)
+            if positive == 0 and zero > 0:
+                largest = Integer(k)
+
+        if min(abs(e) for e in eigenvalues) >= self._float_tolerance:
+            positive = sum(1 for e in eigenvalues if e > 0)
+            self._instance_cache()['_adjacency_inertia'] = (positive, len(eigenvalues) - positive, 0)
+
+        return largest
+
     @classmethod
-    def survey(cls, func, order):
-        # TODO: Write documentation
+    def precompute_spectra(cls, graphs):
+        r"""
+        Compute the adjacency spectra of ``graphs`` with one vectorized
+        eigensolver call per order, and seed the caches behind :meth:`wilf`
+        and :meth:`cvetkovic` with them.
+
+        EXAMPLES:
+
+        ::
+            sage: batch = [INPGraph(g) for g in graphs(5)]
+            sage: INPGraph.precompute_spectra(batch)
+            sage: [g.wilf() for g in batch] == [INPGraph(g).wilf() for g in batch]
+            True
+            sage: [g.cvetkovic() for g in batch] == [INPGraph(g).cvetkovic() for g in batch]
+            True
+        """
+        import numpy
+
+        by_order = {}
+        for g in graphs:
+            if g.order() > 0:
+                by_order.setdefault(g.order(), []).append(g)
+
+        for group in by_order.itervalues():
+            spectra = numpy.linalg.eigvalsh(numpy.array([g._adjacency_array() for g in group]))
+            for (g, eigenvalues) in izip(group, spectra):
+                g._instance_cache()['_largest_eigenvalue'] = g._record_spectrum(eigenvalues)
+
+    @classmethod
+    def _batched(cls, gen, funcs, keep=None):
+        r"""
+        Pass the graphs ``g`` of ``gen`` through as pairs ``(g, keep(g))``,
+        with ``keep`` always true if it is ``None``.
+
+        When one of ``funcs`` reads the spectrum, as marked by its
+        ``_reads_spectrum`` attribute, the kept graphs are held back in runs of
+        ``_spectral_batch_size`` and the spectra of each run are computed at
+        once with :meth:`precompute_spectra`. The other graphs go through
+        straight away, without their spectra.
+        """
+        batching = any(getattr(f, '_reads_spectrum', False) for f in funcs)
+        batch = []
+        try:
+            for g in gen:
+                kept = keep is None or keep(g)
+                if not (batching and kept):
+                    yield (g, kept)
+                    continue
+                batch.append(g)
+                if len(batch) == cls._spectral_batch_size:
+                    cls.precompute_spectra(batch)
+                    for h in batch:
+                        yield (h, True)
+                    batch = []
+            if batch:
+                cls.precompute_spectra(batch)
+                for h in batch:
+                    yield (h, True)
+        finally:
+            gen.close()
+
+    @memoize_instance
+    def _adjacency_masks(self):
+        r"""
+        Return the neighbourhoods as bitsets, bit ``j`` of entry ``i`` being
+        set when vertices ``i`` and ``j`` of :meth:`_vertex_list` are adjacent.
+        """
+        return [sum(1 << j for j in neighbors) for neighbors in self._adjacency_lists()]
+
+    @memoize_instance
+    def _complement_masks(self):
+        r"""
+        Return the neighbourhoods of the complement as bitsets, in the same
+        form as :meth:`_adjacency_masks`.
+        """
+        masks = self._adjacency_masks()
+        everything = (1 << len(masks)) - 1
+        return [everything ^ mask ^ (1 << i) for (i, mask) in enumerate(masks)]
+
+    @memoize_instance
+    def _distance_profiles(self):
+        r"""
+        Return, for every vertex ``v`` in the order of :meth:`_vertex_list`,
+        the tuple ``(eccentricity, total, even, even_horizontal, odd,
+        odd_horizontal)`` of its eccentricity, the sum of its distances, the
+        numbers of vertices at even and at odd distance from it, and the
+        numbers of edges with both ends at even and at odd distance from it.
+        Returns ``None`` for a disconnected graph.
+
+        Each source takes one breadth first search on bitsets, whose layers
+        give the parity classes, and one scan of the edges, which counts the
+        horizontal edges of both parities together. Above
+        ``_large_graph_order`` vertices the bitsets would take quadratic
+        memory, so :meth:`_streamed_distance_profiles` is used instead.
+        """
+        if self.order() > self._large_graph_order:
+            return self._streamed_distance_profiles()
+
+        masks = self._adjacency_masks()
+        n = len(masks)
+        everything = (1 << n) - 1
+        profiles = []
+
+        for source in xrange(n):
+            parity = [0, 0]
+            seen = frontier = 1 << source
+            eccentricity = 0
+            total = 0
+            while frontier:
+                parity[eccentricity % 2] |= frontier
+                total += eccentricity * bin(frontier).count('1')
+                reached = 0
+                rest = frontier
+                while rest:
+                    low = rest & -rest
+                    reached |= masks[low.bit_length() - 1]
+                    rest ^= low
+                frontier = reached & ~seen
+                seen |= frontier
+                if frontier:
+                    eccentricity += 1
+
+            if seen != everything:
+                return None
+
+            horizontal = [0, 0]
+            for v in xrange(n):
+                side = (parity[1] >> v) & 1
+                horizontal[side] += bin(masks[v] & parity[side]).count('1')
+
+            profiles.append((eccentricity, total,
+                             bin(parity[0]).count('1'), horizontal[0] // 2,
+                             bin(parity[1]).count('1'), horizontal[1] // 2))
+
+        return profiles
+
+    def _streamed_distance_profiles(self):
+        r"""
+        Return the same list as :meth:`_distance_profiles`, from one breadth
+        first search on the adjacency lists per source. Only the distances
+        from the current source are kept, so the memory stays linear.
+
+        The ends of an edge are at distances differing by at most one, so the
+        edge is horizontal exactly when both distances are equal.
+        """
+        adj = self._adjacency_lists()
+        n = len(adj)
+        profiles = []
+
+        for source in xrange(n):
+            dist = [-1] * n
+            dist[source] = 0
+            queue = [source]
+            for v in queue:
+                d = dist[v] + 1
+                for w in adj[v]:
+                    if dist[w] == -1:
+                        dist[w] = d
+                        queue.append(w)
+
+            if len(queue) < n:
+                return None
+
+            odd = sum(d & 1 for d in dist)
+            horizontal = [0, 0]
+            for v in xrange(n):
+                d = dist[v]
+                horizontal[d & 1] += sum(1 for w in adj[v] if dist[w] == d)
+
+            profiles.append((dist[queue[-1]], sum(dist),
+                             n - odd, horizontal[0] // 2,
+                             odd, horizontal[1] // 2))
+
+        return profiles
+
+    @memoize_instance
+    def _adjacency_array(self):
+        r"""
+        Return the 0/1 adjacency matrix as a NumPy array, in the vertex order
+        of :meth:`_vertex_list`. It is shared, so it must not be modified.
+        """
+        import numpy
+
+        n = self.order()
+        A = numpy.zeros((n, n))
+        for (i, neighbors) in enumerate(self._adjacency_lists()):
+            A[i, neighbors] = 1.0
+        return A
+
+    @classmethod
+    def from_graph6(cls, s, dense=False):
+        r"""
+        Build a graph straight from a graph6 string, in a single construction.
+
+        INPUT:
+
+        - ``s`` - string -- A graph6 string.
+
+        - ``dense`` - boolean -- Use Sage's dense backend, which stores the
+          adjacency matrix as bitsets, for graphs with at most 64 vertices.
+
+        EXAMPLES:
+
+        ::
+            sage: g = INPGraph.from_graph6('EXCO')
+            sage: g == INPGraph.KillerGraph()
+            True
+            sage: INPGraph.from_graph6('EXCO', dense=True).graph6_string()
+            'EXCO'
+        """
+        sparse = not (dense and cls._graph6_order(s) <= 64)
+        return cls(s, format='graph6', sparse=sparse)
+
+    @classmethod
+    def from_backend(cls, g):
+        r"""
+        Return an INPGraph sharing the backend of the Sage graph ``g``, without
+        copying any vertices or edges. Changes made to either graph are seen by
+        both.
+
+        EXAMPLES:
+
+        ::
+            sage: g = graphs.PetersenGraph()
+            sage: h = INPGraph.from_backend(g)
+            sage: h.matching_number()
+            5
+            sage: h._backend is g._backend
+            True
+
+        Values cached on ``h`` follow changes made through ``g`` ::
+            sage: g = Graph({0: [1, 2, 3]})
+            sage: h = INPGraph.from_backend(g)
+            sage: h.alpha()
+            3
+            sage: g.delete_edge(0, 1)
+            sage: g.add_edge(1, 2)
+            sage: h.alpha()
+            2
+
+        NOTES:
+
+        Mutating ``g`` bypasses the mutators of ``h`` that drop its cache, so
+        :meth:`_instance_cache` checks the vertex and edge sets of ``h`` on
+        every lookup instead, at a cost linear in its size.
+        """
+        if isinstance(g, cls):
+            return g
+        h = cls.__new__(cls)
+        h.__dict__.update(g.__dict__)
+        h._shares_backend = True
+        return h
+
+    @staticmethod
+    def _graph6_order(s):
+        if ord(s[0]) != 126:
+            return ord(s[0]) - 63
+        if ord(s[1]) != 126:
+            return ((ord(s[1]) - 63) << 12) | ((ord(s[2]) - 63) << 6) | (ord(s[3]) - 63)
+        return reduce(lambda n, c: (n << 6) | (ord(c) - 63), s[2:8], 0)
+
+    @classmethod
+    def _geng(cls, options, dense=False):
+        r"""
+        Iterate over the graphs generated by nauty's geng with the given
+        options, building each one directly from geng's graph6 output.
+        """
+        sp = subprocess.Popen(["{0}/local/bin/nauty-geng".format(SAGE_ROOT), "-q"] + options.split(),
+                              stdout=subprocess.PIPE)
+        try:
+            for line in sp.stdout:
+                yield cls.from_graph6(line.strip(), dense)
+        finally:
+            if sp.poll() is None:
+                sp.kill()
+            sp.stdout.close()
+            sp.wait()
+
+    @classmethod
+    def survey(cls, func, order, store=True, output=None):
         # TODO: Is it possible to write tests for this?
+        r"""
+        Count the graphs of the given order that satisfy an alpha property, or
+        whose independence number is predicted by a bound.
+
+        INPUT:
+
+        - ``func`` - function or list of functions -- The alpha properties and
+          bounds to survey. If ``None``, survey every function in the
+          _alpha_properties, _lower_bounds and _upper_bounds settings.
+
+        - ``order`` - int -- The order of the graphs to check.
+
+        - ``store`` - boolean -- Reuse and record values in the survey results
+          at ``_survey_path``. Only the functions whose ``_version`` changed
+          since the stored run, and the independence number of graphs not seen
+          before, are evaluated. Lambdas are never stored.
+
+        - ``output`` - string -- Also write the graph6 string, independence
+          number and every surveyed value of each graph to this file. See
+          :class:`SurveyWriter` for the format.
+        """
         if not is_package_installed("nauty"):
             raise TypeError, "The nauty package is required to survey a bound or property."
 
@@ -77,61 +1498,170 @@ class INPGraph(Graph):
         if order < 6:
             raise ValueError, "There are no difficult graphs with less than 6 vertices."
 
+        if func is None:
+            funcs = cls._alpha_properties + cls._lower_bounds + cls._upper_bounds
+        elif isinstance(func, (list, tuple)):
+            funcs = list(func)
+        else:
+            funcs = [func]
+
         sys.stdout.write("Counting graphs of order {0}... ".format(order))
         sys.stdout.flush()
         num_graphs_to_check = cls.count_viable_graphs(order)
         print num_graphs_to_check
 
-        if __has_progressbar:
-            pbar = ProgressBar(widgets=["Testing: ", Counter(), Bar(), ETA()], maxval=num_graphs_to_check, fd=sys.stdout).start()
+        results = cls._open_survey_results() if store else None
+        writer = SurveyWriter(output, funcs) if output is not None else None
+        need_alpha = writer is not None or any(cls._function_kind(f) != 'alpha_property' for f in funcs)
+
+        pbar = _progress_bar(num_graphs_to_check)
         
-        gen = graphs.nauty_geng("-cd3D{0} {1}".format(order-2, order))
+        gen = cls._batched(cls._geng("-cd3D{0} {1}".format(order-2, order)), funcs)
         counter = 0
-        hits = 0
+        hits = dict((f, 0) for f in funcs)
 
-        is_alpha_property = hasattr(func, '_is_alpha_property') and func._is_alpha_property
-        is_lower_bound = hasattr(func, '_is_lower_bound') and func._is_lower_bound
-        is_upper_bound = hasattr(func, '_is_upper_bound') and func._is_upper_bound
+        try:
+            while True:
+                try:
+                    g = gen.next()[0]
+                    key = g.graph6_string() if results is not None or writer is not None else None
 
-        while True:
+                    values = g._survey_values(funcs, results, key)
+                    alpha = g._survey_value(INPGraph.independence_number, results, key, **cls._alpha_seeds(values)) if need_alpha else None
+
+                    for f in funcs:
+                        if cls._survey_hit(f, values[f], alpha):
+                            hits[f] += 1
+
+                    if writer is not None:
+                        writer.write(key, alpha, values)
+
+                    counter += 1
+
+                    if results is not None and counter % cls._survey_commit_interval == 0:
+                        results.commit()
+
+                    if pbar is not None:
+                        pbar.update(counter)
+                    else:
+                        sys.stdout.write("Testing order {0}: {1}/{2} ({3:.2f}%)\r".format(order, counter, num_graphs_to_check, (float(counter)/num_graphs_to_check)*100))    
+                    sys.stdout.flush()
+
+                except StopIteration:
+                    if pbar is not None:
+                        pbar.finish()
+
+                    for f in funcs:
+                        kind = cls._function_kind(f)
+                        if kind == 'alpha_property':
+                            print "{0} out of {1} graphs of order {2} satisfied {3}.".format(hits[f], counter, order, f.__name__)
+                        elif kind is not None:
+                            print "{0} out of {1} graphs of order {2} were predicted by {3}.".format(hits[f], counter, order, f.__name__)
+                    return
+
+                except KeyboardInterrupt:
+                    print "\nStopped."
+                    return
+        finally:
+            if results is not None:
+                results.close()
+            if writer is not None:
+                writer.close()
+
+    @classmethod
+    def _open_survey_results(cls):
+        folder_path = os.path.dirname(cls._survey_path)
+        if folder_path and not os.path.exists(folder_path):
+            os.makedirs(folder_path)
+        return SurveyResults(cls._survey_path)
+
+    def _survey_value(self, func, results=None, key=None, **kwargs):
+        r"""
+        Return ``func(self, **kwargs)``, taking it from ``results`` when a
+        value with the current version of ``func`` is stored under ``key``, and
+        recording it there otherwise. Raises ``ValueError`` when ``func`` is
+        not defined for the graph.
+        """
+        if results is None:
+            return func(self, **kwargs)
+
+        (found, value) = results.fetch(key, func)
+        if not found:
             try:
-                g = INPGraph(gen.next())
+                value = func(self, **kwargs)
+            except ValueError:
+                value = None
+            results.record(key, func, value)
 
-                try:
-                    if is_alpha_property:
-                        if func(g):
-                            hits += 1
-                    elif is_lower_bound:
-                        if ceil(func(g)) == g.independence_number():
-                            hits += 1
-                    elif is_upper_bound:
-                        if floor(func(g)) == g.independence_number():
-                            hits += 1
+        if value is None:
+            raise ValueError, "{0} is not defined for this graph.".format(func.__name__)
 
-                except ValueError:
-                    pass
+        return value
 
-                counter += 1
+    def _survey_values(self, funcs, results=None, key=None):
+        values = {}
+        for func in funcs:
+            try:
+                values[func] = self._survey_value(func, results, key)
+            except ValueError:
+                values[func] = None
+        return values
 
-                if __has_progressbar:
-                    pbar.update(counter)
-                else:
-                    sys.stdout.write("Testing order {0}: {1}/{2} ({3:.2f}%)\r".format(order, counter, num_graphs_to_check, (float(counter)/num_graphs_to_check)*100))    
-                sys.stdout.flush()
+    @classmethod
+    def _function_kind(cls, func):
+        r"""
+        Return ``'alpha_property'``, ``'lower_bound'`` or ``'upper_bound'``
+        according to the marker attribute of ``func`` or the setting it is
+        listed in, and ``None`` for any other function.
+        """
+        if getattr(func, '_is_alpha_property', False) or func in cls._alpha_properties:
+            return 'alpha_property'
+        elif getattr(func, '_is_lower_bound', False) or func in cls._lower_bounds:
+            return 'lower_bound'
+        elif getattr(func, '_is_upper_bound', False) or func in cls._upper_bounds:
+            return 'upper_bound'
+        return None
 
-            except StopIteration:
-                if __has_progressbar:
-                    pbar.finish()
+    @classmethod
+    def _alpha_seeds(cls, values):
+        r"""
+        Return the best of the surveyed lower bounds in ``values`` as keyword
+        arguments for :meth:`independence_number`.
 
-                if is_alpha_property:
-                    print "{0} out of {1} graphs of order {2} satisfied {3}.".format(hits, counter, order, func.__name__)
-                elif is_lower_bound or is_upper_bound:
-                    print "{0} out of {1} graphs of order {2} were predicted by {3}.".format(hits, counter, order, func.__name__)
-                return
+        The surveyed upper bounds are left out: a survey is how candidate
+        bounds get tested, and :meth:`independence_number` trusts its upper
+        bound, so an invalid one would give a wrong independence number and a
+        false hit. A lower bound is safe, as the search is repeated without it
+        when no set reaches it.
 
-            except KeyboardInterrupt:
-                print "\nStopped."
-                return
+        EXAMPLES:
+
+        ::
+            sage: INPGraph._alpha_seeds({INPGraph.caro_wei: 2, INPGraph.residue: 3, INPGraph.kwok: 3})
+            {'lower_bound': 3}
+        """
+        seeds = {}
+        for (func, value) in values.iteritems():
+            if value is None:
+                continue
+            if cls._function_kind(func) == 'lower_bound' and value > seeds.get('lower_bound', value - 1):
+                seeds['lower_bound'] = value
+        return seeds
+
+    @classmethod
+    def _survey_hit(cls, func, value, alpha):
+        if value is None:
+            return False
+
+        kind = cls._function_kind(func)
+        if kind == 'alpha_property':
+            return bool(value)
+        elif kind == 'lower_bound':
+            return ceil(value) == alpha
+        elif kind == 'upper_bound':
+            return floor(value) == alpha
+
+        return False
 
     @classmethod
     def count_viable_graphs(cls, order):
@@ -149,6 +1679,29 @@ class INPGraph(Graph):
         m = cls._nauty_count_pattern.search(output)
         return int(m.group(1))
 
+    @classmethod
+    def benchmark(cls, funcs, order):
+        r"""
+        Print the time each function takes over all viable graphs of the given
+        order, for comparing implementations of an invariant. ``ValueError``
+        raised by a function counts towards its time.
+        """
+        if not is_package_installed("nauty"):
+            raise TypeError, "The nauty package is required to benchmark a function."
+
+        graph6_strings = [g.graph6_string() for g in cls._geng("-cd3D{0} {1}".format(order-2, order))]
+
+        for func in funcs:
+            # Build fresh graphs so no cached invariants are reused.
+            test_graphs = [cls.from_graph6(s) for s in graph6_strings]
+            start = time.time()
+            for g in test_graphs:
+                try:
+                    func(g)
+                except ValueError:
+                    pass
+            print "{0}: {1:.3f}s for {2} graphs of order {3}".format(getattr(func, '__name__', func), time.time() - start, len(test_graphs), order)
+
     @classmethod
     def _next_difficult_graph_of_order(cls, order, verbose=True, save=False):
         if not is_package_installed("nauty"): 
@@ -164,19 +1717,22 @@ class INPGraph(Graph):
             num_graphs_to_check = cls.count_viable_graphs(order)
             print num_graphs_to_check
 
-            if __has_progressbar:
-                pbar = ProgressBar(widgets=["Testing: ", Counter(), Bar(), ETA()], maxval=num_graphs_to_check, fd=sys.stdout).start()
+            pbar = _progress_bar(num_graphs_to_check)
 
-        gen = graphs.nauty_geng("-cd3D{0} {1}".format(order-2, order))
+        # Only the graphs without an alpha property have their bounds
+        # computed, so only they need their spectra.
+        gen = cls._batched(cls._geng("-cd3D{0} {1}".format(order-2, order)),
+                           cls._lower_bounds + cls._upper_bounds,
+                           lambda g: not g.has_alpha_property())
         counter = 0
 
         while True:
             try:
-                g = INPGraph(gen.next())
+                (g, kept) = gen.next()
                 
-                if g.is_difficult():
+                if kept and g._has_bound_gap():
                     if verbose:
-                        if __has_progressbar:
+                        if pbar is not None:
                             pbar.finish()
                         print "Found a difficult graph: {0} (Checked {1}/{2} graphs of order {3}.)".format(g.graph6_string(), counter, num_graphs_to_check, order)
 
@@ -188,7 +1744,7 @@ class INPGraph(Graph):
                 counter += 1
 
                 if verbose:
-                    if __has_progressbar:
+                    if pbar is not None:
                         pbar.update(counter)
                     else:
                         sys.stdout.write("Testing order {0}: {1}/{2} ({3:.2f}%)\r".format(order, counter, num_graphs_to_check, (float(counter)/num_graphs_to_check)*100))
@@ -196,7 +1752,7 @@ class INPGraph(Graph):
 
             except StopIteration:
                 if verbose:
-                    if __has_progressbar:
+                    if pbar is not None:
                         pbar.finish()
                     else:
                         print
@@ -271,19 +1827,18 @@ class INPGraph(Graph):
                     sys.stdout.flush()
                     print num_graphs_to_check
 
-                    if __has_progressbar:
-                        pbar = ProgressBar(widgets=["Testing: ", Counter(), Bar(), ETA()], maxval=num_graphs_to_check, fd=sys.stdout).start()
+                    pbar = _progress_bar(num_graphs_to_check)
 
-                gen = graphs.nauty_geng("-c {0}".format(order))
+                gen = cls._geng("-c {0}".format(order))
                 counter = 0
 
                 while True:
                     try:
-                        g = INPGraph(gen.next())
+                        g = gen.next()
                         
                         if func(g):
                             if verbose:
-                                if __has_progressbar:
+                                if pbar is not None:
                                     pbar.finish()
                                 print "Found an example graph: {0} (Checked {1}/{2} graphs of order {3}.)".format(g.graph6_string(), counter, num_graphs_to_check, order)
 
@@ -293,7 +1848,7 @@ class INPGraph(Graph):
                         counter += 1
 
                         if verbose:
-                            if __has_progressbar:
+                            if pbar is not None:
                                 pbar.update(counter)
                             else:
                                 sys.stdout.write("Testing order {0}: {1}/{2} ({3:.2f}%)\r".format(order, counter, num_graphs_to_check, (float(counter)/num_graphs_to_check)*100))
@@ -301,7 +1856,7 @@ class INPGraph(Graph):
 
                     except StopIteration:
                         if verbose:
-                            if __has_progressbar:
+                            if pbar is not None:
                                 pbar.finish()
                             else:
                                 print
@@ -317,21 +1872,38 @@ class INPGraph(Graph):
                 return None
 
 
-    def is_difficult(self):
+    def is_difficult(self, reduced=False):
         # TODO: Is it possible to write good tests for this?
         r"""
         This function determines if the graph is difficult as described by
         INP theory.
 
+        INPUT:
+
+        - ``reduced`` - boolean -- Test the kernel left by :meth:`kernelize`
+          instead, which can be difficult even when the graph itself has an
+          alpha property. An empty kernel is not difficult.
+
         NOTES:
 
         The return value of this function may change depending on the functions
         included in the _lower_bounds, _upper_bounds, and _alpha_properties
         settings.
         """
+        if reduced:
+            kernel = self.kernelize()[0]
+            return kernel.order() > 0 and kernel.is_difficult()
+
         if self.has_alpha_property():
             return False
 
+        return self._has_bound_gap()
+
+    def _has_bound_gap(self):
+        r"""
+        Return True if :meth:`best_lower_bound` and :meth:`best_upper_bound`
+        do not pin down the independence number.
+        """
         lbound = ceil(self.best_lower_bound())
         ubound = floor(self.best_upper_bound())
 
@@ -349,12 +1921,13 @@ class INPGraph(Graph):
         NOTES:
 
         The return value of this function may change depending on the functions
-        included in the _lower_bounds setting.
+        included in the _lower_bounds setting, and for graphs of order above
+        _large_graph_order on the selection made by :meth:`_bound_functions`.
         """
         # The default bound is 1
         lbound = 1
 
-        for func in self._lower_bounds:
+        for func in self._bound_functions(self._lower_bounds):
             try:
                 new_bound = func(self)
                 if new_bound > lbound:
@@ -370,15 +1943,25 @@ class INPGraph(Graph):
         This function computes an upper bound for the independence number of
         the graph.
 
+        EXAMPLES:
+
+        Large sparse graphs only get bounds without quadratic memory::
+            sage: G = INPGraph(graphs.GridGraph([60, 60]))
+            sage: G.best_upper_bound()
+            1800
+            sage: G.best_lower_bound() <= 1800
+            True
+
         NOTES:
 
         The return value of this function may change depending on the functions
-        included in the _upper_bounds setting.
+        included in the _upper_bounds setting, and for graphs of order above
+        _large_graph_order on the selection made by :meth:`_bound_functions`.
         """
         # The default upper bound is the number of vertices
         ubound = self.order()
 
-        for func in self._upper_bounds:
+        for func in self._bound_functions(self._upper_bounds):
             try:
                 new_bound = func(self)
                 if new_bound < ubound:
@@ -388,6 +1971,22 @@ class INPGraph(Graph):
 
         return ubound
 
+    def _bound_functions(self, funcs):
+        r"""
+        Return the bound functions of ``funcs`` to try on this graph. Above
+        ``_large_graph_order`` vertices these are only the ones with a
+        ``_memory`` estimate, which marks them as needing no dense matrix or
+        bitsets, whose estimate for this graph is at most
+        ``_large_graph_memory`` bytes. Most of them are near-linear; the
+        distance bounds take one streamed breadth first search per vertex.
+        """
+        n = self.order()
+        if n <= self._large_graph_order:
+            return funcs
+
+        m = self.size()
+        return [func for func in funcs if hasattr(func, '_memory') and func._memory(n, m) <= self._large_graph_memory]
+
     def has_alpha_property(self):
         # TODO: Is it possible to write good tests for this?
         r"""
@@ -408,9 +2007,33 @@ class INPGraph(Graph):
 
         return False
 
+    @classmethod
+    def difficult_graphs(cls):
+        r"""
+        Open the store of difficult graphs found so far, at
+        ``_difficult_graphs_path``.
+        """
+        if not os.path.exists(cls._save_path):
+            os.makedirs(cls._save_path)
+        return DifficultGraphs(cls._difficult_graphs_path)
+
     def save_files(self):
-        # TODO: Write documentation
         # TODO: Is it possible to write good tests for this?
+        r"""
+        Record the graph in :meth:`difficult_graphs` and, unless an isomorphic
+        graph was recorded before, save a PNG plot and a PDF dossier of it to a
+        timestamped folder under ``_save_path``.
+        """
+        store = self.difficult_graphs()
+        try:
+            is_new = store.add(self)
+        finally:
+            store.close()
+
+        if not is_new:
+            print "An isomorphic graph was already saved."
+            return
+
         timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
         filename = "difficult_graph_{0}".format(timestamp)
         folder_path = "{0}/{1}".format(self._save_path, filename)
@@ -445,6 +2068,9 @@ class INPGraph(Graph):
         # TODO: Is it possible to write good tests for this?
         # TODO: Check for tkz style files
 
+        from string import Template
+        from sage.misc.latex import latex
+
         if self.is_difficult():
             difficult_text = "\\textbf{This graph is difficult!} & \\danger \\\\"
         else:
@@ -641,6 +2267,57 @@ class INPGraph(Graph):
     def SkewStar(cls):
         return cls.SuperClaw(1,2,3)
 
+    @memoize_instance
+    def maximum_matching(self):
+        r"""
+        Return a maximum matching of the graph as a list of edges, computed
+        with Edmonds' blossom algorithm.
+
+        EXAMPLES:
+
+        ::
+            sage: INPGraph(2).maximum_matching()
+            []
+            sage: INPGraph(graphs.PathGraph(4)).maximum_matching()
+            [(0, 1), (2, 3)]
+            sage: M = INPGraph(graphs.PetersenGraph()).maximum_matching()
+            sage: len(M), len(set(v for e in M for v in e))
+            (5, 10)
+        """
+        verts = self._vertex_list()
+        mate = _edmonds_matching(self._adjacency_lists())
+        return [(verts[i], verts[j]) for (i, j) in enumerate(mate) if i < j]
+
+    @memoize_instance
+    def _bidouble_mates(self):
+        r"""
+        Return a maximum matching ``(mate_left, mate_right)`` of the bipartite
+        double cover, computed with Hopcroft-Karp directly on the adjacency
+        lists of the graph: left vertex ``i`` stands for ``(v_i, 0)`` and right
+        vertex ``j`` for ``(v_j, 1)``.
+        """
+        adj = self._adjacency_lists()
+        return _hopcroft_karp(adj, len(adj))
+
+    def bipartite_double_cover_matching(self):
+        r"""
+        Return a maximum matching of :meth:`bipartite_double_cover` as a list of
+        edges ``((u, 0), (v, 1))``.
+
+        EXAMPLES:
+
+        ::
+            sage: G = INPGraph(graphs.CycleGraph(5))
+            sage: M = G.bipartite_double_cover_matching()
+            sage: len(M), all(G.bipartite_double_cover().has_edge(e) for e in M)
+            (5, True)
+            sage: len(INPGraph(graphs.PathGraph(3)).bipartite_double_cover_matching())
+            2
+        """
+        verts = self._vertex_list()
+        (mate_left, mate_right) = self._bidouble_mates()
+        return [((verts[i], 0), (verts[j], 1)) for (i, j) in enumerate(mate_left) if j != -1]
+
     @memoize_graphs
     def matching_number(self):
         r"""
@@ -665,25 +2342,37 @@ class INPGraph(Graph):
             sage: INPGraph(graphs.PetersenGraph()).matching_number()
             5
 
-        WARNINGS:
+        It agrees with Sage's LP-based matching ::
+            sage: all(INPGraph(g).matching_number() == g.matching(value_only=True, use_edge_labels=False) for g in graphs(6))
+            True
 
-        Ideally we would set use_edge_labels=False to ignore edge weighting and
-        always compute the traditional matching number, but there is a bug
-        in Sage 5.2 that returns double this number. Calling this on an
-        edge-weighted graph will NOT give the usual matching number.
-        """
-        if float(sage.version.version) < 5.3:
-            warnings.warn("A bug in Sage versions < 5.3 may return an incorrect matching number.")
+        NOTES:
 
-        return int(self.matching(value_only=True, use_edge_labels=False))
+        This uses the combinatorial :meth:`maximum_matching`, so edge labels
+        are always ignored. Compare its speed with Sage's matching using
+        ``INPGraph.benchmark([INPGraph.matching_number, lambda g: g.matching(value_only=True, use_edge_labels=False)], 9)``.
+        """
+        return len(self.maximum_matching())
 
     mu = matching_number
 
-    def independence_number(self):
+    def independence_number(self, lower_bound=None, upper_bound=None, reduced=False):
         r"""
-        Compute the independence number using the Sage built-in independent_set
-        method. This uses the Cliquer algorithm, which does not run in
-        polynomial time.
+        Compute the independence number with a branch and bound search on
+        adjacency bitsets, which does not run in polynomial time.
+
+        INPUT:
+
+        - ``lower_bound``, ``upper_bound`` -- Known bounds on the independence
+          number, such as :meth:`best_lower_bound` and
+          :meth:`best_upper_bound`. The search only looks for sets of at least
+          the lower bound and stops as soon as it finds one of the size of the
+          upper bound. The upper bound is trusted and never checked, so an
+          invalid one can give an answer that is too small; if no set reaches
+          the lower bound, the search is repeated without it.
+
+        - ``reduced`` - boolean -- Search only the kernel left by
+          :meth:`kernelize`, and add its offset.
 
         EXAMPLES:
 
@@ -704,11 +2393,45 @@ class INPGraph(Graph):
             2
             sage: INPGraph(graphs.PetersenGraph()).alpha()
             4
+
+        Bounds only make the search shorter ::
+            sage: G = INPGraph(graphs.PetersenGraph())
+            sage: G.independence_number(lower_bound=3, upper_bound=4)
+            4
+            sage: G.bounded_independence_number()
+            4
+            sage: INPGraph(graphs.CycleGraph(7)).independence_number(reduced=True)
+            3
+            sage: all(INPGraph(g).alpha() == len(g.independent_set()) for g in graphs(6))
+            True
         """
-        return int(len(self.independent_set()))
+        if reduced:
+            (kernel, offset) = self.kernelize()
+            shift = lambda bound: None if bound is None else bound - offset
+            return offset + kernel.independence_number(shift(lower_bound), shift(upper_bound))
+
+        masks = self._adjacency_masks()
+        lower = 0 if lower_bound is None else max(int(ceil(lower_bound)) - 1, 0)
+        upper = None if upper_bound is None else int(floor(upper_bound))
+
+        (size, subset) = _maximum_independent_set(masks, lower, upper)
+        if subset is None and lower > 0:
+            (size, subset) = _maximum_independent_set(masks, 0, upper)
+
+        return int(size)
+    # Stored values from surveys that seeded the search with surveyed upper
+    # bounds may be wrong.
+    independence_number._version = 2
 
     alpha = independence_number
 
+    def bounded_independence_number(self):
+        r"""
+        Compute the independence number with the search seeded by
+        :meth:`best_lower_bound` and :meth:`best_upper_bound`.
+        """
+        return self.independence_number(self.best_lower_bound(), self.best_upper_bound())
+
     def bipartite_double_cover(self):
         r"""
         Return a bipartite double cover of the graph, also known as the
@@ -823,35 +2546,160 @@ class INPGraph(Graph):
         #                 blocks.append(S)
         # return blocks
 
-        if trivial:
-            stability = lambda s: len(s) == self.closed_neighborhood_subgraph(s).independence_number()
-        else:
+        verts = self._vertex_list()
+        blocks = [I for (I, stable, difference) in self._classified_independent_sets() if stable]
+        if not trivial:
             alpha = self.independence_number()
-            stability = lambda s: len(s) > 0 and len(s) < alpha and len(s) == self.closed_neighborhood_subgraph(s).independence_number()
+            blocks = [I for I in blocks if len(I) > 0 and len(I) < alpha]
+
+        return [[verts[i] for i in I] for I in blocks]
+
+    def _classified_independent_sets(self):
+        r"""
+        Iterate over ``(I, stable, difference)`` for every independent set,
+        given as a list ``I`` of vertex indices in the order of
+        :meth:`independent_sets`, where ``stable`` tells whether it is a
+        stable block and ``difference`` is `|I| - |N(I)|`.
+
+        `I` is a stable block when `\alpha(G[N[I]]) = |I|`. That independence
+        number is computed on bitsets and memoized by the bitmask of `N[I]`,
+        which many independent sets share.
+        """
+        masks = self._adjacency_masks()
+        memo = {}
+
+        for I in self._independent_set_indices():
+            inside = 0
+            closed = 0
+            for i in I:
+                inside |= 1 << i
+                closed |= masks[i]
+            closed |= inside
+
+            if closed not in memo:
+                # I itself shows alpha >= |I|, so only larger sets are searched.
+                memo[closed] = _maximum_independent_set(masks, max(len(I) - 1, 0), None, closed)[0]
 
-        return filter(stability, self.independent_sets())
+            yield (I, memo[closed] == len(I), len(I) - bin(closed & ~inside).count('1'))
 
-    def independent_sets(self):
+    def independent_sets(self, min_size=0, max_size=None):
         r"""
-        Return a list of all independent sets in the graph.
+        Iterate over the independent sets of the graph with between
+        ``min_size`` and ``max_size`` vertices, by increasing size and then in
+        lexicographic order of the vertices.
+
+        EXAMPLES:
+
+        ::
+            sage: list(INPGraph(graphs.PathGraph(3)).independent_sets())
+            [[], [0], [1], [2], [0, 2]]
+            sage: list(INPGraph(graphs.CycleGraph(5)).independent_sets(min_size=2))
+            [[0, 2], [0, 3], [1, 3], [1, 4], [2, 4]]
 
         NOTES:
-        This is a naive algorithm and does not run in polynomial time.
-        """
-        alpha = self.independence_number()
-        sets = [[]]
-        for k in range(1, alpha + 1):
-            for S in combinations_iterator(self.vertices(), k):
-                if self.is_independent_set(S):
-                    sets.append(S)
-        return sets
+
+        Only independent sets are ever extended, each by the later vertices
+        of a candidate bitset that excludes its neighbors, so the work is
+        proportional to the number of independent sets rather than of
+        subsets. Each size is generated by a fresh depth first search, which
+        keeps memory linear in the order of the graph however many sets are
+        consumed. The enumeration stops at the first size with no sets. This
+        does not run in polynomial time.
+        """
+        verts = self._vertex_list()
+        for I in self._independent_set_indices(min_size, max_size):
+            yield [verts[i] for i in I]
+
+    def _independent_set_indices(self, min_size=0, max_size=None, candidates=None, feasible=None):
+        r"""
+        Iterate over the independent sets as :meth:`independent_sets` does,
+        each given as a new list of vertex indices. Only vertices in the bitset
+        ``candidates`` are used, and a set for which ``feasible`` returns
+        False is neither produced nor extended.
+        """
+        masks = self._adjacency_masks()
+        everything = (1 << len(masks)) - 1
+        if candidates is not None:
+            everything &= candidates
+
+        def extend(chosen, candidates, remaining):
+            while candidates:
+                if bin(candidates).count('1') < remaining:
+                    return
+                low = candidates & -candidates
+                candidates ^= low
+                v = low.bit_length() - 1
+                chosen.append(v)
+                if feasible is not None and not feasible(chosen):
+                    chosen.pop()
+                    continue
+                if remaining == 1:
+                    yield chosen
+                else:
+                    for S in extend(chosen, candidates & ~masks[v], remaining - 1):
+                        yield S
+                chosen.pop()
+
+        k = min_size
+        while max_size is None or k <= max_size:
+            if k == 0:
+                yield []
+            else:
+                found = False
+                for S in extend([], everything, k):
+                    found = True
+                    yield list(S)
+                if not found:
+                    return
+            k += 1
 
     def critical_independent_sets(self):
         r"""
         Return a list of all critical independent sets in the graph.
 
+        EXAMPLES:
+
+        ::
+            sage: INPGraph(graphs.PathGraph(3)).critical_independent_sets()
+            [[0, 2]]
+            sage: INPGraph('Cx').critical_independent_sets()
+            [[], [3], [0, 3], [1, 3]]
+
+        It agrees with the enumeration of all independent sets ::
+            sage: all(INPGraph(g).critical_independent_sets() == INPGraph(g)._critical_independent_sets_naive() for g in graphs(6))
+            True
+
         NOTES:
-        This is a naive algorithm and does not run in polynomial time.
+
+        Every critical independent set lies in the union of MCIS, so only
+        independent subsets of it are enumerated, and a set is only extended
+        while some critical independent set contains it, which is tested
+        with one matching of the bidouble (see :meth:`_extends_to_critical`).
+        The time is polynomial per critical independent set, but there can
+        be exponentially many of them.
+        """
+        verts = self._vertex_list()
+        adj = self._adjacency_lists()
+        base = self._bidouble_mates()
+        d_c = len(adj) - sum(1 for j in base[0] if j != -1)
+
+        union = sum(1 << i for i in self._union_MCIS_indices())
+        feasible = lambda A: self._extends_to_critical(A, base)
+
+        sets = []
+        for I in self._independent_set_indices(candidates=union, feasible=feasible):
+            N = set()
+            for i in I:
+                N.update(adj[i])
+            if len(I) - len(N) == d_c:
+                sets.append([verts[i] for i in I])
+        return sets
+    cis = critical_independent_sets
+
+    def _critical_independent_sets_naive(self):
+        r"""
+        Return :meth:`critical_independent_sets` by grouping all independent
+        sets by `|I| - |N(I)|`. This is exponential and kept as a check.
         """
         cis = {}
         for I in self.independent_sets():
@@ -861,24 +2709,98 @@ class INPGraph(Graph):
             else:
                 cis[key] = [I]
         return cis[max(cis.keys())]
-    cis = critical_independent_sets
 
-    def critical_independence_number(self):
-        return max(len(I) for I in self.critical_independent_sets())
-    alpha_c = critical_independence_number
+    def _extends_to_critical(self, A, base=None):
+        r"""
+        Return True if the independent set with indices ``A`` is contained in
+        some critical independent set.
+
+        That happens exactly when the bidouble has a maximum independent set
+        containing both copies of `A`, that is, when deleting both copies of
+        `N[A]` lowers its independence number by exactly `2|A|`. The matching
+        ``base`` of the bidouble is repaired rather than recomputed.
+        """
+        adj = self._adjacency_lists()
+        n = len(adj)
+        if base is None:
+            base = self._bidouble_mates()
+        mu = sum(1 for j in base[0] if j != -1)
+
+        removed = set(A)
+        for a in A:
+            removed.update(adj[a])
+        mu_test = sum(1 for j in self._bidouble_mates_without(removed, base)[0] if j != -1)
+
+        return 2 * (n - len(removed)) - mu_test + 2 * len(A) == 2 * n - mu
+
+    def critical_independence_number(self):
+        r"""
+        Return the critical independence number `\alpha_c`, the size of a
+        largest critical independent set.
+
+        EXAMPLES:
+
+        ::
+            sage: INPGraph('Cx').critical_independence_number()
+            2
+            sage: INPGraph(graphs.CycleGraph(5)).alpha_c()
+            0
+            sage: all(INPGraph(g).alpha_c() == max(len(I) for I in INPGraph(g)._critical_independent_sets_naive()) for g in graphs(6))
+            True
+
+        NOTES:
+
+        Vertices of the union of MCIS are added greedily as long as some
+        critical independent set still contains the chosen ones. The result
+        is a critical independent set that no other one contains, and those
+        are maximum. This takes one matching repair per vertex.
+        """
+        masks = self._adjacency_masks()
+        base = self._bidouble_mates()
+
+        A = []
+        chosen = 0
+        for i in self._union_MCIS_indices():
+            if chosen & masks[i]:
+                continue
+            if self._extends_to_critical(A + [i], base):
+                A.append(i)
+                chosen |= 1 << i
+        return len(A)
+    alpha_c = critical_independence_number
+
+    def block_survey(self):
+        r"""
+        Print every independent set, marking the stable blocks, the critical
+        independent sets, the largest of those and the maximum independent
+        sets.
+
+        EXAMPLES:
+
+        ::
+            sage: INPGraph(graphs.PathGraph(3)).block_survey()
+            [] Stable
+            [0] Stable
+            [1]
+            [2] Stable
+            [0, 2] Stable CIS MaxCIS Max
+
+        NOTES:
 
-    def block_survey(self):
-        SB = self.stable_blocks()
-        CIS = self.critical_independent_sets()
-        IS = self.independent_sets()
-        alpha = self.independence_number()
-        alpha_c = self.critical_independence_number()
-
-        for I in IS:
-            output = str(I)
-            if I in SB:
+        Every independent set is classified in a single enumeration, see
+        :meth:`_classified_independent_sets`.
+        """
+        verts = self._vertex_list()
+        records = list(self._classified_independent_sets())
+        alpha = max(len(I) for (I, stable, difference) in records)
+        d_c = max(difference for (I, stable, difference) in records)
+        alpha_c = max(len(I) for (I, stable, difference) in records if difference == d_c)
+
+        for (I, stable, difference) in records:
+            output = str([verts[i] for i in I])
+            if stable:
                 output += " Stable"
-            if I in CIS:
+            if difference == d_c:
                 output += " CIS"
                 if len(I) == alpha_c:
                     output += " MaxCIS"
@@ -886,6 +2808,54 @@ class INPGraph(Graph):
                 output += " Max"
             print output
 
+    def _bidouble_mates_without(self, removed, base=None):
+        r"""
+        Return a maximum matching ``(mate_left, mate_right)`` of the bipartite
+        double cover with both copies of the vertices whose indices are in
+        ``removed`` deleted. It is repaired from the matching ``base`` of a
+        larger subgraph, :meth:`_bidouble_mates` by default, so it costs at
+        most one augmentation per matched edge that was lost.
+        """
+        (mate_left, mate_right) = base if base is not None else self._bidouble_mates()
+        n = len(mate_left)
+        alive = [True] * n
+        for i in removed:
+            alive[i] = False
+
+        left = [j if alive[i] and j != -1 and alive[j] else -1 for (i, j) in enumerate(mate_left)]
+        right = [-1] * n
+        for (i, j) in enumerate(left):
+            if j != -1:
+                right[j] = i
+
+        return _hopcroft_karp(self._adjacency_lists(), n, left, right, alive, alive)
+
+    def _union_MCIS_indices(self, deleted=frozenset()):
+        r"""
+        Iterate over the indices of the vertices that are in some critical
+        independent set of the graph with the vertices whose indices are in
+        ``deleted`` removed. A vertex is, exactly when deleting the closed
+        neighborhoods of both of its copies lowers the independence number of
+        the bidouble by 2.
+        """
+        adj = self._adjacency_lists()
+        n = len(adj)
+
+        base = self._bidouble_mates_without(deleted) if deleted else self._bidouble_mates()
+        mu = sum(1 for j in base[0] if j != -1)
+        alpha = 2 * (n - len(deleted)) - mu
+
+        for i in range(n):
+            if i in deleted:
+                continue
+
+            removed = deleted.union(adj[i]).union([i])
+            mu_test = sum(1 for j in self._bidouble_mates_without(removed, base)[0] if j != -1)
+            alpha_test = 2 * (n - len(removed)) - mu_test
+
+            if alpha_test + 2 == alpha:
+                yield i
+
     def union_MCIS(self):
         r"""
         Return a union of maximum critical independent sets (MCIS).
@@ -897,20 +2867,38 @@ class INPGraph(Graph):
             [0, 1, 3]
             sage: INPGraph(graphs.CycleGraph(4)).union_MCIS()
             [0, 1, 2, 3]
+
+        NOTES:
+
+        This computes one maximum matching of the bipartite double cover and
+        repairs it after deleting each closed neighborhood, rather than
+        copying the bidouble and matching it from scratch for every vertex.
         """
-        b = self.bipartite_double_cover()
-        alpha = b.order() - b.matching_number()
+        verts = self._vertex_list()
+        return [verts[i] for i in self._union_MCIS_indices()]
 
-        result = []
+    def _critical_independent_set_indices(self):
+        r"""
+        Return the indices of a critical independent set, which is nonempty
+        whenever the KE part of the graph is. If the one read off the maximum
+        matching of the bidouble is empty, the first vertex `v` of the union
+        of MCIS is forced in by matching the bidouble without the closed
+        neighborhoods of both copies of `v`.
+        """
+        adj = self._adjacency_lists()
+        (mate_left, mate_right) = self._bidouble_mates()
+        I = _critical_independent_set(adj, mate_left, mate_right)
+        if I:
+            return I
 
-        for v in self.vertices():
-            test = b.copy()
-            test.delete_vertices(b.closed_neighborhood([(v,0), (v,1)]))
-            alpha_test = test.order() - test.matching_number() + 2
-            if alpha_test == alpha:
-                result.append(v)
+        for i in self._union_MCIS_indices():
+            removed = set(adj[i])
+            removed.add(i)
+            (mate_left, mate_right) = self._bidouble_mates_without(removed)
+            alive = [u not in removed for u in range(len(adj))]
+            return _critical_independent_set(adj, mate_left, mate_right, alive) + [i]
 
-        return result
+        return []
 
     def has_foldable_vertex(self):
         r"""
@@ -930,13 +2918,8 @@ class INPGraph(Graph):
             sage: INPGraph(graphs.CompleteBipartiteGraph(3, 3)).has_foldable_vertex()
             False
         """
-        # for v in self.vertices():
-        #     if self.has_foldable_vertex_at(v):
-        #         return True
-        # return False
-
-        # This any/imap version should be faster.
-        return any(imap(self.has_foldable_vertex_at, self.vertices()))
+        masks = self._adjacency_masks()
+        return not all(_has_anti_triangle(masks, N) for N in masks)
 
 
     def has_foldable_vertex_at(self, v):
@@ -958,7 +2941,8 @@ class INPGraph(Graph):
             False
         """
         # Returns True if N(v) contains no anti-triangles
-        return self.open_neighborhood_subgraph(v).complement().is_triangle_free()
+        masks = self._adjacency_masks()
+        return not _has_anti_triangle(masks, masks[self._vertex_index()[v]])
 
     def fold_at(self, v):
         r"""
@@ -992,6 +2976,159 @@ class INPGraph(Graph):
         g.delete_vertices(Nv.vertices())
         return g
 
+    @classmethod
+    def _induced_pattern_table(cls, k):
+        r"""
+        Return the table of :func:`_induced_pattern_tables` for the patterns
+        of ``_induced_pattern_graphs`` on ``k`` vertices, building it on first
+        use, since the labellings of the larger patterns are slow to list.
+        """
+        if k not in cls._induced_patterns:
+            patterns = [(name, g) for (name, g) in cls._induced_pattern_graphs if g.order() == k]
+            cls._induced_patterns[k] = _induced_pattern_tables(patterns).get(k, {})
+        return cls._induced_patterns[k]
+
+    def _find_induced(self, k, names, done=None):
+        r"""
+        Return the set of the patterns in ``names``, all on ``k`` vertices,
+        that occur as induced subgraphs.
+
+        Every ``k``-subset of vertices is visited once and classified by
+        looking the bitmask of its induced edges up in the table of
+        :meth:`_induced_pattern_table`.
+        The census stops early once ``done(found)`` is true, by default once
+        every pattern has been found.
+        """
+        wanted = set(names)
+        found = set()
+        if done is None:
+            done = lambda found: found == wanted
+
+        table = self._induced_pattern_table(k)
+        masks = self._adjacency_masks()
+        pairs = list(combinations(range(k), 2))
+
+        for subset in combinations(range(len(masks)), k):
+            mask = 0
+            bit = 1
+            for (a, b) in pairs:
+                if (masks[subset[a]] >> subset[b]) & 1:
+                    mask |= bit
+                bit <<= 1
+
+            hits = wanted.intersection(table.get(mask, ()))
+            if hits - found:
+                found.update(hits)
+                if done(found):
+                    break
+
+        return found
+
+    def kernelize(self):
+        r"""
+        Apply the reductions behind the alpha properties until none applies,
+        and return ``(kernel, offset)`` with `\alpha(G) = \alpha(kernel) +
+        offset`.
+
+        The reductions, tried in this order, are:
+
+        - A simplicial vertex `v`, which covers isolated and pendant vertices,
+          is in some maximum independent set: delete `N[v]`, offset 1.
+
+        - A foldable vertex `v` whose neighborhood has fewer anti-edges than
+          `|N[v]|` is folded as in :meth:`fold_at`, offset 1.
+
+        - A magnet `a, b` (see :meth:`has_magnet`) is replaced by one vertex
+          adjacent to `N(a) \cap N(b)`, offset 0.
+
+        - A nonempty critical independent set `I`, found from the bidouble
+          when the KE part is nonempty, is in some maximum independent set:
+          delete `N[I]`, offset `|I|`.
+
+        EXAMPLES:
+
+        ::
+            sage: (K, offset) = INPGraph(graphs.PathGraph(5)).kernelize()
+            sage: K.order(), offset
+            (0, 3)
+            sage: (K, offset) = INPGraph(graphs.PetersenGraph()).kernelize()
+            sage: K.order(), offset
+            (10, 0)
+            sage: all(K.alpha() + offset == INPGraph(g).alpha() for g in graphs(7) for (K, offset) in [INPGraph(g).kernelize()])
+            True
+        """
+        adj = dict((v, set(self.neighbor_iterator(v))) for v in self.vertex_iterator())
+        offset = [0]
+
+        def delete(vertices):
+            for v in list(vertices):
+                for w in adj.pop(v):
+                    if w in adj:
+                        adj[w].discard(v)
+
+        def add(label, neighbors):
+            adj[label] = set(neighbors)
+            for w in neighbors:
+                adj[w].add(label)
+
+        def simplicial():
+            for (v, N) in adj.iteritems():
+                if all(N <= adj[u] | set([u]) for u in N):
+                    delete(N | set([v]))
+                    offset[0] += 1
+                    return True
+            return False
+
+        def fold():
+            for (v, N) in adj.iteritems():
+                N = list(N)
+                anti = [(a, b) for (k, a) in enumerate(N) for b in N[k+1:] if b not in adj[a]]
+                if not anti or len(anti) > len(N):
+                    continue
+                if any(c != a and c != b and c not in adj[a] and c not in adj[b] for (a, b) in anti for c in N):
+                    continue
+
+                closed = set(N)
+                closed.add(v)
+                new_nodes = []
+                for (a, b) in anti:
+                    add((a, b), ((adj[a] | adj[b]) - closed) | set(new_nodes))
+                    new_nodes.append((a, b))
+                delete(closed)
+                offset[0] += 1
+                return True
+            return False
+
+        def magnet():
+            for (a, Na) in adj.iteritems():
+                for b in Na:
+                    Na_minus_Nb = Na - adj[b] - set([b])
+                    Nb_minus_Na = adj[b] - Na - set([a])
+                    if all(Nb_minus_Na <= adj[u] for u in Na_minus_Nb):
+                        common = Na & adj[b]
+                        delete([a, b])
+                        add((a, b), common)
+                        return True
+            return False
+
+        def critical():
+            g = INPGraph(dict((v, list(N)) for (v, N) in adj.iteritems()))
+            verts = g._vertex_list()
+            I = [verts[i] for i in g._critical_independent_set_indices()]
+            if not I:
+                return False
+            closed = set(I)
+            for v in I:
+                closed.update(adj[v])
+            delete(closed)
+            offset[0] += len(I)
+            return True
+
+        while adj and (simplicial() or fold() or magnet() or critical()):
+            pass
+
+        return (INPGraph(dict((v, list(N)) for (v, N) in adj.iteritems())), offset[0])
+
     def is_bull_free(self):
         r"""
         Returns true if the graph is bull-free, that is, it does not contain
@@ -1007,7 +3144,7 @@ class INPGraph(Graph):
             sage: INPGraph('EyGW').is_bull_free()
             False
         """
-        return self.subgraph_search(graphs.BullGraph(), induced=True) is None
+        return not self._find_induced(5, ['bull'])
 
     def is_chair_free(self):
         r"""
@@ -1024,37 +3161,37 @@ class INPGraph(Graph):
             sage: INPGraph('EiEG').is_chair_free()
             False
         """
-        return self.subgraph_search(INPGraph.ChairGraph(), induced=True) is None
+        return not self._find_induced(5, ['chair'])
 
     def is_co_chair_free(self):
-        return self.subgraph_search(INPGraph.CoChairGraph(), induced=True) is None
+        return not self._find_induced(5, ['co_chair'])
 
     def is_p5_free(self):
-        return self.subgraph_search(graphs.PathGraph(5), induced=True) is None
+        return not self._find_induced(5, ['p5'])
     is_co_house_free = is_p5_free
 
     def is_house_free(self):
-        return self.subgraph_search(graphs.HouseGraph(), induced=True) is None
+        return not self._find_induced(5, ['house'])
     is_co_p5_free = is_house_free
 
     def is_p_free(self):
-        return self.subgraph_search(INPGraph.PGraph(), induced=True) is None
+        return not self._find_induced(5, ['p'])
 
     def is_co_p_free(self):
-        return self.subgraph_search(INPGraph.CoPGraph(), induced=True) is None
+        return not self._find_induced(5, ['co_p'])
 
     def is_gem_free(self):
-        return self.subgraph_search(INPGraph.GemGraph(), induced=True) is None
+        return not self._find_induced(5, ['gem'])
 
     def is_p4_free(self):
-        return self.subgraph_search(graphs.PathGraph(4), induced=True) is None
+        return not self._find_induced(4, ['p4'])
     is_co_gem_free = is_p4_free
 
     def is_diamond_free(self):
-        return self.subgraph_search(graphs.DiamondGraph(), induced=True) is None
+        return not self._find_induced(4, ['diamond'])
 
     def is_skew_star_free(self):
-        return self.subgraph_search(INPGraph.SkewStar(), induced=True) is None
+        return not self._find_induced(7, ['skew_star'])
 
     ###########################################################################
     # Alpha properties
@@ -1091,8 +3228,7 @@ class INPGraph(Graph):
             sage: INPGraph(graphs.ClawGraph()).is_claw_free()
             False
         """
-        #return self.subgraph_search_count(graphs.ClawGraph()) == 0
-        return self.subgraph_search(graphs.ClawGraph(), induced=True) is None
+        return not self._find_induced(4, ['claw'])
     is_claw_free._is_alpha_property = True
 
     def has_pendant_vertex(self):
@@ -1108,7 +3244,7 @@ class INPGraph(Graph):
             sage: INPGraph(graphs.PathGraph(3)).has_pendant_vertex()
             True
         """
-        return 1 in self.degree()
+        return any(len(neighbors) == 1 for neighbors in self._adjacency_lists())
     has_pendant_vertex._is_alpha_property = True
 
     def has_simplicial_vertex(self):
@@ -1124,14 +3260,18 @@ class INPGraph(Graph):
             sage: INPGraph(graphs.CompleteGraph(4)).has_simplicial_vertex()
             True
         """
-        # for v in self.vertices():
-        #     if self.open_neighborhood_subgraph(v).is_clique():
-        #         return True
-        # return False
-
-        # This any/imap version should be faster.
-        neighborhood_is_clique = lambda v: self.open_neighborhood_subgraph(v).is_clique()
-        return any(imap(neighborhood_is_clique, self.vertices()))
+        masks = self._adjacency_masks()
+        for N in masks:
+            # N(v) is a clique if each u in it is adjacent to the rest of N(v).
+            rest = N
+            while rest:
+                low = rest & -rest
+                rest ^= low
+                if N & ~masks[low.bit_length() - 1] & ~low:
+                    break
+            else:
+                return True
+        return False
     has_simplicial_vertex._is_alpha_property = True
 
     @memoize_graphs
@@ -1166,14 +3306,7 @@ class INPGraph(Graph):
         if self.is_bipartite():
             return True
 
-        # c = self.union_MCIS()
-        # # nc = []
-        # # for v in c:
-        # #     nc.extend(self.neighbors(v))
-        # nc = self.open_neighborhood(c)
-
-        # return list(set(c + nc)) == self.vertices()
-        return self.vertices() == self.closed_neighborhood(self.union_MCIS())
+        return set(self.closed_neighborhood(self.union_MCIS())) == set(self.vertices())
     is_KE._is_alpha_property = True
 
     def is_almost_KE(self):
@@ -1193,57 +3326,122 @@ class INPGraph(Graph):
             True
 
         """
-        # subsets = combinations_iterator(self.vertices(), self.order() - 1)
-        # for subset in subsets:
-        #     if self.subgraph(subset).is_KE():
-        #         return True
+        return self.almost_KE_vertex() is not None
+    is_almost_KE._is_alpha_property = True
 
-        # return False
+    def almost_KE_vertex(self):
+        r"""
+        Return the first vertex whose deletion leaves a Konig-Egervary graph,
+        or ``None`` if there is no such vertex.
 
-        # This any/imap version should be faster.
-        subgraph_is_KE = lambda s: self.subgraph(s).is_KE()
-        return any(imap(subgraph_is_KE, combinations_iterator(self.vertices(), self.order() - 1)))
-    is_almost_KE._is_alpha_property = True
+        EXAMPLES:
+
+        ::
+            sage: INPGraph(graphs.CompleteGraph(3)).almost_KE_vertex()
+            0
+            sage: INPGraph(graphs.CompleteGraph(4)).almost_KE_vertex() is None
+            True
+
+        NOTES:
+
+        No subgraphs are built. The matching of the bidouble is repaired once
+        for each deleted vertex `v`, and again for each closed neighborhood
+        when computing the union of MCIS of `G - v`.
+        """
+        adj = self._adjacency_lists()
+        n = len(adj)
+
+        for v in range(n):
+            if self._is_bipartite_without(v):
+                return self._vertex_list()[v]
+
+            covered = set([v])
+            for i in self._union_MCIS_indices(frozenset([v])):
+                covered.add(i)
+                covered.update(adj[i])
+
+            if len(covered) == n:
+                return self._vertex_list()[v]
+
+        return None
+
+    def _is_bipartite_without(self, v):
+        r"""
+        Return True if deleting the vertex with index ``v`` leaves a bipartite
+        graph.
+        """
+        adj = self._adjacency_lists()
+        color = [-1] * len(adj)
+        color[v] = 2
+
+        for root in range(len(adj)):
+            if color[root] != -1:
+                continue
+            color[root] = 0
+            stack = [root]
+            while stack:
+                u = stack.pop()
+                for w in adj[u]:
+                    if color[w] == -1:
+                        color[w] = 1 - color[u]
+                        stack.append(w)
+                    elif color[w] == color[u]:
+                        return False
+
+        return True
 
     def has_nonempty_KE_part(self):
-        # TODO: Write tests
-        # TODO: Write documentation
-        # if self.union_MCIS():
-        #     return True
-        # else:
-        #     return False
-        #return bool(self.union_MCIS())
+        r"""
+        Return True if the graph has a nonempty critical independent set,
+        that is, a nonempty KE part.
 
+        EXAMPLES:
+
+        ::
+            sage: INPGraph('Cx').has_nonempty_KE_part()
+            True
+            sage: INPGraph(graphs.CycleGraph(5)).has_nonempty_KE_part()
+            False
+        """
         # We don't need to create the whole union of MCIS, we can stop if
         # one vertex satisfies it.
-        # TODO: Can we speed this up further by removing copying?
-        b = self.bipartite_double_cover()
-        alpha = b.order() - b.matching_number()
-
-        for v in self.vertices():
-            test = b.copy()
-            test.delete_vertices(b.closed_neighborhood([(v,0), (v,1)]))
-            alpha_test = test.order() - test.matching_number() + 2
-            if alpha_test == alpha:
-                return True
-
-        return False
+        return any(True for i in self._union_MCIS_indices())
     has_nonempty_KE_part._is_alpha_property = True
 
     def is_fold_reducible(self):
-        # TODO: Write tests
-        # TODO: Write documentation
-        if not self.has_foldable_vertex():
-            return False
+        r"""
+        Return True if the graph has a foldable vertex `v` whose fold is
+        smaller than the graph, that is, `N(v)` has no anti-triangle and
+        fewer anti-edges than `|N[v]|` (see :meth:`fold_at`).
 
-        for v in self.vertices():
-            if self.has_foldable_vertex_at(v):
-                #if self.fold_at(v).order() < n:
-                # We should be able to estimate this without actually folding
-                Nv = self.closed_neighborhood_subgraph(v)
-                Nv_c = Nv.complement()
-                if Nv_c.size() - Nv.order() < 0:
-                    return True
+        EXAMPLES:
+
+        ::
+            sage: INPGraph('EqW_').is_fold_reducible()
+            True
+            sage: INPGraph(graphs.CompleteBipartiteGraph(3, 3)).is_fold_reducible()
+            False
+            sage: INPGraph(graphs.PetersenGraph()).is_fold_reducible()
+            False
+
+        NOTES:
+
+        Each vertex is tested once on the adjacency bitsets, counting the
+        anti-edges first since that is cheaper than looking for an
+        anti-triangle, and the test stops at the first reducible vertex.
+        """
+        masks = self._adjacency_masks()
+        for N in masks:
+            # Twice the number of anti-edges in N(v).
+            anti = 0
+            rest = N
+            while rest:
+                low = rest & -rest
+                rest ^= low
+                anti += bin(N & ~masks[low.bit_length() - 1] & ~low).count('1')
+
+            if anti // 2 < bin(N).count('1') + 1 and not _has_anti_triangle(masks, N):
+                return True
         return False
     is_fold_reducible._is_alpha_property = True
 
@@ -1264,48 +3462,112 @@ class INPGraph(Graph):
             sage: INPGraph.KillerGraph().has_magnet()
             True
         """
-        for a, b in self.edge_iterator(labels=False):
-            Na_minus_Nb = set(self.neighbors(a)).difference(self.neighbors(b))
-            Nb_minus_Na = set(self.neighbors(b)).difference(self.neighbors(a))
-
-            # Check if completely linked
-            if all(self.has_edge(u,v) for u in Na_minus_Nb for v in Nb_minus_Na):
-                return True
+        masks = self._adjacency_masks()
+        for (a, neighbors) in enumerate(self._adjacency_lists()):
+            for b in neighbors:
+                if b > a:
+                    continue
+                # a and b themselves are adjacent to everything on the other
+                # side, so they can be left out.
+                Na_minus_Nb = masks[a] & ~masks[b] & ~(1 << b)
+                Nb_minus_Na = masks[b] & ~masks[a] & ~(1 << a)
+
+                # Check if completely linked
+                rest = Na_minus_Nb
+                while rest:
+                    low = rest & -rest
+                    rest ^= low
+                    if Nb_minus_Na & ~masks[low.bit_length() - 1]:
+                        break
+                else:
+                    return True
 
         return False
     has_magnet._is_alpha_property = True
 
+    def is_perfect(self, *args, **kwargs):
+        r"""
+        Return True if the graph is perfect, that is, by the Strong Perfect
+        Graph Theorem, if neither it nor its complement has an odd hole.
+        Arguments such as ``certificate`` are passed on to
+        :meth:`Graph.is_perfect`.
+
+        EXAMPLES:
+
+        ::
+            sage: INPGraph(graphs.PetersenGraph()).is_perfect()
+            False
+            sage: INPGraph(graphs.CycleGraph(5)).is_perfect()
+            False
+            sage: INPGraph(graphs.CycleGraph(7).complement()).is_perfect()
+            False
+            sage: INPGraph(graphs.CompleteBipartiteGraph(3, 4)).is_perfect()
+            True
+
+        It agrees with Sage ::
+            sage: all(INPGraph(g).is_perfect() == g.is_perfect() for g in graphs(7))
+            True
+
+        NOTES:
+
+        The odd holes are looked for by :func:`_has_odd_hole` on the adjacency
+        bitsets and on the complement bitsets of :meth:`_complement_masks`,
+        stopping at the first one. The result is cached on the graph itself;
+        a canonical form would cost more than the search, and geng never
+        repeats an isomorphism class anyway.
+        """
+        if args or kwargs:
+            return Graph.is_perfect(self, *args, **kwargs)
+        return self._is_perfect()
+    is_perfect._is_alpha_property = True
+
+    @memoize_instance
+    def _is_perfect(self):
+        # The smallest imperfect graph is the 5-cycle.
+        if self.order() < 5:
+            return True
+        return not (_has_odd_hole(self._adjacency_masks()) or
+                    _has_odd_hole(self._complement_masks()))
+
     def is_forbidden_subgraph_free(self):
-        results = {
-            'co_gem_free':      self.is_co_gem_free(),
-            'claw_free':        self.is_claw_free(),
-            'chair_free':       self.is_chair_free(),
-            'p5_free':          self.is_p5_free(),
-            'p_free':           self.is_p_free(),
-            'co_p_free':        self.is_co_p_free(),
-            'bull_free':        self.is_bull_free(),
-            'co_chair_free':    self.is_co_chair_free(),
-            'house_free':       self.is_house_free(),
-            'gem_free':         self.is_gem_free(),
-            'diamond_free':     self.is_diamond_free(),
-            'skew_star_free':   self.is_skew_star_free()
-        }
+        r"""
+        Return True if the graph is free of one of the combinations of
+        forbidden induced subgraphs for which the independence number is
+        known to be polynomial.
+
+        EXAMPLES:
+
+        ::
+            sage: INPGraph(graphs.PetersenGraph()).is_forbidden_subgraph_free()
+            True
+            sage: INPGraph.KillerGraph().is_forbidden_subgraph_free()
+            True
+
+        The census agrees with ``subgraph_search`` ::
+            sage: all(INPGraph(g).is_p5_free() == (g.subgraph_search(graphs.PathGraph(5), induced=True) is None) for g in graphs(6))
+            True
+
+        NOTES:
+
+        The 4-vertex subsets are classified first, then the 5-vertex ones and
+        finally the 7-vertex ones, and each census stops as soon as it cannot
+        change the answer any more.
+        """
+        # co_gem_free is the same test as P4-free here, see is_co_gem_free.
+        found4 = self._find_induced(4, ['p4', 'claw', 'diamond'])
+        if 'p4' not in found4 or 'claw' not in found4:
+            return True
+
+        # Each of these is enough together with P5-free.
+        partners = ['co_p', 'p', 'bull', 'co_chair', 'house', 'gem']
+        settled = lambda found: 'chair' in found and ('p5' in found or ('diamond' in found4 and found.issuperset(partners)))
+        found5 = self._find_induced(5, ['chair', 'p5'] + partners, settled)
+        if 'chair' not in found5:
+            return True
+        if 'p5' not in found5 and ('diamond' not in found4 or not found5.issuperset(partners)):
+            return True
 
-        return any([
-                results['co_gem_free'],
-                results['claw_free'],
-                results['chair_free'],
-                results['skew_star_free'],
-                (results['p5_free'] and results['co_gem_free']),
-                (results['p5_free'] and results['chair_free']),
-                (results['p5_free'] and results['co_p_free']),
-                (results['p5_free'] and results['p_free']),
-                (results['p5_free'] and results['bull_free']),
-                (results['p5_free'] and results['co_chair_free']),
-                (results['p5_free'] and results['house_free']),
-                (results['p5_free'] and results['gem_free']),
-                (results['p5_free'] and results['diamond_free'])
-            ])
+        return not self._find_induced(7, ['skew_star'])
 
     is_forbidden_subgraph_free._is_alpha_property = True
 
@@ -1348,6 +3610,7 @@ class INPGraph(Graph):
         d = Rational(self.average_degree())
         return n / (1 + d)
     average_degree_bound._is_lower_bound = True
+    average_degree_bound._memory = _linear_memory
 
     def caro_wei(self):
         r"""
@@ -1365,6 +3628,7 @@ class INPGraph(Graph):
         """
         return sum(1/(1+Integer(d)) for d in self.degree())
     caro_wei._is_lower_bound = True
+    caro_wei._memory = _linear_memory
 
     def seklow(self):
         # TODO: Write tests
@@ -1377,16 +3641,20 @@ class INPGraph(Graph):
         return sum(coeff(v) * (1 + max(0, self.degree(v) * coeff(v) - \
             sum(coeff(w) for w in self.neighbors(v)))) for v in self.vertices())
     seklow._is_lower_bound = True
+    seklow._memory = _linear_memory
 
     def wilf(self):
         # TODO: Write tests
         # TODO: Write documentation
         n = Integer(self.order())
-        max_eigenvalue = max(self.spectrum())
-        if max_eigenvalue not in QQ:
+        max_eigenvalue = self._largest_eigenvalue()
+        if max_eigenvalue not in ZZ:
             max_eigenvalue = RR(max_eigenvalue)
         return n / (1 + max_eigenvalue)
     wilf._is_lower_bound = True
+    wilf._reads_spectrum = True
+    # Lanczos keeps about twenty vectors of length n.
+    wilf._memory = lambda n, m: _linear_memory(n, m) + 160 * n
 
     def hansen_zheng_lower_bound(self):
         # TODO: Write tests
@@ -1395,6 +3663,7 @@ class INPGraph(Graph):
         e = Integer(self.size())
         return ceil(n - (2 * e)/(1 + floor(2 * e / n)))
     hansen_zheng_lower_bound._is_lower_bound = True
+    hansen_zheng_lower_bound._memory = _linear_memory
 
     def harant(self):
         # TODO: Write tests
@@ -1404,6 +3673,49 @@ class INPGraph(Graph):
         term = 2 * e + n + 1
         return 0.5 * (term - sqrt(term**2 - 4*n**2))
     harant._is_lower_bound = True
+    harant._memory = _linear_memory
+
+    def radius(self, *args, **kwargs):
+        r"""
+        Return the radius of the graph, taken from the distance profiles of
+        connected graphs and from :meth:`Graph.radius` otherwise.
+
+        EXAMPLES:
+
+        ::
+            sage: G = INPGraph.KillerGraph()
+            sage: G.radius() == Graph.radius(G)
+            True
+        """
+        profiles = self._distance_profiles() if not args and not kwargs else None
+        if profiles is None:
+            return Graph.radius(self, *args, **kwargs)
+        return Integer(min(ecc for (ecc, total, even, eh, odd, oh) in profiles))
+    radius._is_lower_bound = True
+    radius._memory = _linear_memory
+
+    def average_distance(self, *args, **kwargs):
+        r"""
+        Return the average distance between distinct vertices, taken from the
+        distance profiles of connected graphs and from
+        :meth:`Graph.average_distance` otherwise.
+
+        EXAMPLES:
+
+        ::
+            sage: G = INPGraph(graphs.PetersenGraph())
+            sage: G.average_distance()
+            5/3
+            sage: G.average_distance() == Graph.average_distance(G)
+            True
+        """
+        n = self.order()
+        profiles = self._distance_profiles() if n > 1 and not args and not kwargs else None
+        if profiles is None:
+            return Graph.average_distance(self, *args, **kwargs)
+        return Integer(sum(total for (ecc, total, even, eh, odd, oh) in profiles)) / (n * (n - 1))
+    average_distance._is_lower_bound = True
+    average_distance._memory = _linear_memory
 
     def max_even_minus_even_horizontal(self):
         r"""
@@ -1430,15 +3742,13 @@ class INPGraph(Graph):
             sage: INPGraph(graphs.CycleGraph(5)).max_even_minus_even_horizontal()
             2
         """
-        if not self.is_connected():
+        profiles = self._distance_profiles()
+        if profiles is None:
             raise ValueError, "This bound is not defined for disconnected graphs."
 
-        dist = self.distance_all_pairs()
-        even = lambda v: [w for w in self.vertices() if dist[v][w] % 2 == 0]
-        eh = lambda v: self.subgraph(even(v)).size()
-
-        return max(len(even(v)) - eh(v) for v in self.vertices())
+        return max(Integer(even - eh) for (ecc, total, even, eh, odd, oh) in profiles)
     max_even_minus_even_horizontal._is_lower_bound = True
+    max_even_minus_even_horizontal._memory = _linear_memory
 
     def max_odd_minus_odd_horizontal(self):
         r"""
@@ -1465,15 +3775,13 @@ class INPGraph(Graph):
             sage: INPGraph(graphs.CycleGraph(5)).max_odd_minus_odd_horizontal()
             2
         """
-        if not self.is_connected():
+        profiles = self._distance_profiles()
+        if profiles is None:
             raise ValueError, "This bound is not defined for disconnected graphs."
 
-        dist = self.distance_all_pairs()
-        odd = lambda v: [w for w in self.vertices() if dist[v][w] % 2 == 1]
-        oh = lambda v: self.subgraph(odd(v)).size()
-
-        return max(len(odd(v)) - oh(v) for v in self.vertices())
+        return max(Integer(odd - oh) for (ecc, total, even, eh, odd, oh) in profiles)
     max_odd_minus_odd_horizontal._is_lower_bound = True    
+    max_odd_minus_odd_horizontal._memory = _linear_memory
 
     def five_fourteenths_lower_bound(self):
         # TODO: Write documentation
@@ -1498,28 +3806,73 @@ class INPGraph(Graph):
         ::
             sage: INPGraph(graphs.CompleteGraph(3)).angel_campigotto_laforest()
             1
-            sage: INPGraph(graphs.StarGraph(3)).angel_campigotto_laforest()
+            sage: round(INPGraph(graphs.StarGraph(3)).angel_campigotto_laforest(), 4)
+            2.6667
+            sage: INPGraph(graphs.StarGraph(3))._angel_campigotto_laforest_exact()
             8/3
+
+        NOTES:
+
+        The variance terms are summed over all pairs at once in floating
+        point, with common neighbour counts from `A^2`. The result is exact
+        when the expected size attains `n - c`, and is recomputed exactly
+        with rationals when it lies near an integer, so its ceiling is
+        always right.
         """
+        import numpy
+
         n = self.order()
         c = len(self.connected_components())
-        d = lambda u: Integer(self.degree(u))
+        degrees = [Integer(len(neighbors)) for neighbors in self._adjacency_lists()]
+
+        expected_size = n - sum(Integer(1)/(d + 1) for d in degrees)
+
+        if expected_size == (n - c):
+            return c
 
+        A = self._adjacency_array()
+        d = A.sum(axis=1)
+        w = 1.0 / (d + 1)
+        common = A.dot(A)
+        nonadjacent = (A == 0)
+        numpy.fill_diagonal(nonadjacent, False)
 
-        expected_size = n - sum(Integer(1)/(d(u) + 1) for u in self.vertices())
+        variance = (d * w * w).sum() - w.dot(A).dot(w) + \
+                   (numpy.where(nonadjacent, common / (2 + d[:, None] + d[None, :] - common), 0.0) * numpy.outer(w, w)).sum()
+
+        value = n - (float(expected_size) - variance/(n - c - float(expected_size)))
+        if abs(value - round(value)) < self._float_tolerance:
+            return self._angel_campigotto_laforest_exact()
+        return value
+
+    def _angel_campigotto_laforest_exact(self):
+        r"""
+        Compute :meth:`angel_campigotto_laforest` with rational arithmetic,
+        counting common neighbours on bitsets.
+        """
+        n = self.order()
+        c = len(self.connected_components())
+        masks = self._adjacency_masks()
+        d = [Integer(len(neighbors)) for neighbors in self._adjacency_lists()]
+
+        expected_size = n - sum(Integer(1)/(d[u] + 1) for u in xrange(n))
 
         if expected_size == (n - c):
             return c
-        else:
-            d_uv = lambda u, v: Integer(len(set(self.neighbors(u)).intersection(self.neighbors(v))))
 
-            variance = sum(d(u)/((d(u) + 1)**2) for u in self.vertices()) - \
-                       2 * sum(1/((d(u)+1)*(d(v)+1)) for u, v in self.edge_iterator(labels=False)) + \
-                       2 * sum(d_uv(u,v)/((d(u)+1)*(d(v)+1)*(2+d(u)+d(v)-d_uv(u,v))) for u, v in self.complement().edge_iterator(labels=False))
-            
-            return n - (expected_size - variance/(n - c - expected_size))
+        variance = sum(d[u]/((d[u] + 1)**2) for u in xrange(n))
+        for u in xrange(n):
+            for v in xrange(u):
+                if (masks[u] >> v) & 1:
+                    variance -= 2 / ((d[u] + 1) * (d[v] + 1))
+                else:
+                    d_uv = Integer(bin(masks[u] & masks[v]).count('1'))
+                    variance += 2 * d_uv/((d[u] + 1) * (d[v] + 1) * (2 + d[u] + d[v] - d_uv))
+
+        return n - (expected_size - variance/(n - c - expected_size))
 
     angel_campigotto_laforest._is_lower_bound = True
+    angel_campigotto_laforest._version = 2
 
     ###########################################################################
     # Upper bounds
@@ -1549,26 +3902,28 @@ class INPGraph(Graph):
         ::
             sage: G = INPGraph(graphs.CompleteGraph(3))
             sage: G.fractional_alpha()
-            1.5
+            3/2
             sage: G = INPGraph(graphs.PathGraph(3))
             sage: G.fractional_alpha()
-            2.0
-        """
-        p = MixedIntegerLinearProgram(maximization=True)
-        x = p.new_variable()
-        p.set_objective(sum(x[v] for v in self.vertices()))
-
-        for v in self.vertices():
-            p.add_constraint(x[v], max=1)
+            2
+            sage: G = INPGraph(graphs.PetersenGraph())
+            sage: G.fractional_alpha()
+            5
 
-        for (u,v) in self.edge_iterator(labels=False):
-            p.add_constraint(x[u] + x[v], max=1)
+        NOTES:
 
-        return p.solve()
+        The fractional independence number is half the independence number of
+        the bipartite double cover, `\alpha_f = n - \mu(B)/2`, so it is read
+        off the bidouble matching shared with the KE properties instead of
+        solving a linear program.
+        """
+        n = Integer(self.order())
+        mu = sum(1 for j in self._bidouble_mates()[0] if j != -1)
+        return n - Integer(mu) / 2
     fractional_alpha._is_upper_bound = True
+    fractional_alpha._memory = _linear_memory
 
     def lovasz_theta(self):
-        # TODO: There has to be a nicer way of doing this.
         r"""
         Compute the value of the Lovasz theta function of the given graph.
 
@@ -1581,47 +3936,202 @@ class INPGraph(Graph):
 
         For a complete graph `G`, `\vartheta(G) = 1`::
             sage: G = INPGraph(graphs.CompleteGraph(3))
-            sage: G.lovasz_theta()
-            1.0
+            sage: abs(G.lovasz_theta() - 1) < 1e-6
+            True
 
         For a pentagon (five-cycle) graph `G`, `\vartheta(G) = \sqrt{5}`::
             sage: G = INPGraph(graphs.CycleGraph(5))
-            sage: G.lovasz_theta()
-            2.236
+            sage: abs(G.lovasz_theta() - sqrt(5)) < 1e-6
+            True
 
         For the Petersen graph `G`, `\vartheta(G) = 4`::
             sage: G = INPGraph(graphs.PetersenGraph())
-            sage: G.lovasz_theta()
-            4.0
+            sage: abs(G.lovasz_theta() - 4) < 1e-6
+            True
+            sage: floor(G.lovasz_theta())
+            4
+
+        NOTES:
+
+        The value is the upper end of :meth:`lovasz_theta_bounds`, so it is
+        within the solver tolerance above theta and never below it. Bound
+        consumers such as :meth:`is_difficult` take its floor.
         """
-        cvxopt.solvers.options['show_progress'] = False
-        cvxopt.solvers.options['abstol'] = float(1e-10)
-        cvxopt.solvers.options['reltol'] = float(1e-10)
+        return float(self.lovasz_theta_bounds()[1])
+    lovasz_theta._is_upper_bound = True
+    lovasz_theta._version = 3
+
+    def lovasz_theta_bounds(self, solver=None, canonical=False):
+        r"""
+        Return certified bounds ``(lower, upper)`` on the Lovasz theta of the
+        graph.
+
+        INPUT:
+
+        - ``solver`` -- ``'cvxopt'`` for the interior point solver, ``'admm'``
+          for the first order solver, whose memory use is `O(n^2)`, or
+          ``None`` to pick ``'admm'`` for graphs with more than
+          ``_lovasz_theta_admm_order`` vertices and ``'cvxopt'`` otherwise.
+
+        - ``canonical`` - boolean -- Also share the bounds between isomorphic
+          graphs through ``_lovasz_theta_cache``. This costs a canonical
+          labelling per graph, so it only pays off when graphs repeat.
+
+        EXAMPLES:
+
+        ::
+            sage: G = INPGraph(graphs.CycleGraph(7))
+            sage: (lower, upper) = G.lovasz_theta_bounds()
+            sage: c = cos(pi/7).n()
+            sage: lower <= 7 * c / (1 + c) <= upper
+            True
+            sage: upper - lower < 1e-6
+            True
 
-        gc = self.complement()
-        n = gc.order()
-        m = gc.size()
+        Both solvers certify their answer, with or without symmetry ::
+            sage: G = INPGraph.KillerGraph()
+            sage: (lower, upper) = G._lovasz_theta_sdp(symmetric=False)
+            sage: (a, b) = G._lovasz_theta_sdp(solver='admm')
+            sage: max(lower, a) <= min(upper, b)
+            True
+            sage: G.lovasz_theta_bounds(solver='admm', canonical=True) == G._lovasz_theta_cache[(G.canonical_label().graph6_string(), 'admm')]
+            True
+
+        NOTES:
+
+        Bounds are cached per solver, ``None`` standing for the solver it
+        picks, on the graph itself and, if ``canonical``, by canonical form in
+        ``_lovasz_theta_cache``, so naming a solver never returns bounds that
+        another one computed. For a vertex-transitive graph, `\vartheta(G)
+        \vartheta(\bar{G}) = n`, so with ``canonical`` a cached complement
+        from the same solver answers it, and if it is also edge-transitive then
+        `\vartheta(G) = -n \lambda_n / (\lambda_1 - \lambda_n)` from the
+        adjacency eigenvalues. Otherwise the SDP is solved, by cvxopt with one
+        variable per orbit of the automorphism group, or by ADMM. The lower
+        bound comes from a feasible primal matrix and the upper bound from a
+        feasible dual matrix, so floating point error in the solver cannot
+        push theta outside them.
+        """
+        if solver is None:
+            solver = 'admm' if self.order() > self._lovasz_theta_admm_order else 'cvxopt'
+
+        cache = self._instance_cache().setdefault('lovasz_theta_bounds', {})
+        if solver not in cache:
+            if canonical:
+                key = (self.canonical_label().graph6_string(), solver)
+                bounds = self._lovasz_theta_cache.get(key)
+                if bounds is None:
+                    bounds = self._lovasz_theta(solver, canonical)
+                self._remember_lovasz_theta(key, bounds)
+            else:
+                bounds = self._lovasz_theta(solver, canonical)
+            cache[solver] = bounds
+        return cache[solver]
+
+    @classmethod
+    def _remember_lovasz_theta(cls, key, bounds):
+        r"""
+        Store ``bounds`` as the most recent entry of ``_lovasz_theta_cache``,
+        dropping the oldest entries beyond ``_lovasz_theta_cache_size``.
+        """
+        cls._lovasz_theta_cache.pop(key, None)
+        cls._lovasz_theta_cache[key] = bounds
+        while len(cls._lovasz_theta_cache) > cls._lovasz_theta_cache_size:
+            cls._lovasz_theta_cache.popitem(last=False)
 
+    def _lovasz_theta(self, solver, canonical=False):
+        n = self.order()
         if n == 1:
-            return 1.0
+            return (1.0, 1.0)
 
-        d = m + n
-        c = -1 * cvxopt.base.matrix([0.0]*(n-1) + [2.0]*(d-n))
-        Xrow = [i*(1+n) for i in xrange(n-1)] + [b+a*n for (a, b) in gc.edge_iterator(labels=False)]
-        Xcol = range(n-1) + range(d-1)[n-1:]
-        X = cvxopt.base.spmatrix(1.0, Xrow, Xcol, (n*n, d-1))
+        (vertex_orbits, edge_orbits, nonedge_orbits) = self._pair_orbits()
 
-        for i in xrange(n-1):
-            X[n*n-1, i] = -1.0
+        if len(vertex_orbits) == 1:
+            if not edge_orbits:
+                return (float(n), float(n))
 
-        sol = cvxopt.solvers.sdp(c, Gs=[-X], hs=[-cvxopt.base.matrix([0.0]*(n*n-1) + [-1.0], (n,n))])
-        v = 1.0 + cvxopt.base.matrix(-c, (1, d-1)) * sol['x']
+            if canonical:
+                complement_key = (self.complement().canonical_label().graph6_string(), solver)
+                if complement_key in self._lovasz_theta_cache:
+                    (lower, upper) = self._lovasz_theta_cache[complement_key]
+                    return (n / upper, n / lower)
 
-        # TODO: Rounding here is a total hack, sometimes it can come in slightly
-        # under the analytical answer, for example, 2.999998 instead of 3, which
-        # screws up the floor() call when checking difficult graphs.
-        return round(v[0], 3)
-    lovasz_theta._is_upper_bound = True
+            if len(edge_orbits) == 1:
+                import numpy
+                eigenvalues = numpy.linalg.eigvalsh(self._adjacency_array())
+                theta = -n * eigenvalues[0] / (eigenvalues[-1] - eigenvalues[0])
+                bounds = (max(theta - 1e-9 * n, 1.0), min(theta + 1e-9 * n, float(n)))
+            else:
+                bounds = self._lovasz_theta_sdp(solver=solver)
+
+            if canonical:
+                self._remember_lovasz_theta(complement_key, (n / bounds[1], n / bounds[0]))
+            return bounds
+
+        return self._lovasz_theta_sdp(solver=solver)
+
+    def _lovasz_theta_sdp(self, symmetric=True, solver='cvxopt'):
+        r"""
+        Return certified bounds on the Lovasz theta from the SDP without any
+        cache or closed form. With ``solver='cvxopt'`` there is one variable
+        per orbit of the automorphism group if ``symmetric``, or one per
+        vertex and non-edge otherwise. ADMM always solves the full SDP.
+        """
+        A = self._adjacency_array()
+        if solver == 'admm':
+            return _lovasz_theta_admm(A)
+        if solver != 'cvxopt':
+            raise ValueError, "Unknown Lovasz theta solver: %s" % solver
+
+        n = self.order()
+        if symmetric:
+            (vertex_orbits, edge_orbits, nonedge_orbits) = self._pair_orbits()
+        else:
+            adj = [set(neighbors) for neighbors in self._adjacency_lists()]
+            vertex_orbits = [[i] for i in range(n)]
+            nonedge_orbits = [[(i, j)] for i in range(n) for j in range(i) if j not in adj[i]]
+        return _lovasz_theta_sdp(A, vertex_orbits, nonedge_orbits)
+
+    @memoize_instance
+    def _pair_orbits(self):
+        r"""
+        Return the orbits of the automorphism group on the vertices, the edges
+        and the non-edges, with vertices given by index and pairs as ``(i, j)``
+        with ``i > j``.
+        """
+        verts = self._vertex_list()
+        index = self._vertex_index()
+        adj = [set(neighbors) for neighbors in self._adjacency_lists()]
+        n = len(verts)
+
+        (group, orbits) = self.automorphism_group(orbits=True)
+        vertex_orbits = [sorted(index[v] for v in orbit) for orbit in orbits]
+
+        pairs = [(i, j) for i in range(n) for j in range(i)]
+        parent = dict((p, p) for p in pairs)
+
+        def find(p):
+            while parent[p] != p:
+                parent[p] = parent[parent[p]]
+                p = parent[p]
+            return p
+
+        for gen in group.gens():
+            image = [index[gen(v)] for v in verts]
+            for (i, j) in pairs:
+                (a, b) = (image[i], image[j])
+                q = (a, b) if a > b else (b, a)
+                (rp, rq) = (find((i, j)), find(q))
+                if rp != rq:
+                    parent[rp] = rq
+
+        classes = {}
+        for p in pairs:
+            classes.setdefault(find(p), []).append(p)
+
+        edge_orbits = [orbit for orbit in classes.values() if orbit[0][1] in adj[orbit[0][0]]]
+        nonedge_orbits = [orbit for orbit in classes.values() if orbit[0][1] not in adj[orbit[0][0]]]
+        return (vertex_orbits, edge_orbits, nonedge_orbits)
 
     def kwok(self):
         # TODO: Write more tests
@@ -1646,6 +4156,7 @@ class INPGraph(Graph):
 
         return n - e / Delta
     kwok._is_upper_bound = True
+    kwok._memory = _linear_memory
 
     def hansen_zheng_upper_bound(self):
         # TODO: Write more tests
@@ -1664,6 +4175,7 @@ class INPGraph(Graph):
         e = Integer(self.size())
         return floor(.5 + sqrt(.25 + n**2 - n - 2*e))
     hansen_zheng_upper_bound._is_upper_bound = True
+    hansen_zheng_upper_bound._memory = _linear_memory
 
     def min_degree_bound(self):
         r"""
@@ -1682,6 +4194,7 @@ class INPGraph(Graph):
         """
         return self.order() - self.min_degree()
     min_degree_bound._is_upper_bound = True
+    min_degree_bound._memory = _linear_memory
 
     def cvetkovic(self):
         # TODO: Write more tests
@@ -1696,21 +4209,17 @@ class INPGraph(Graph):
             sage: G = INPGraph(graphs.PetersenGraph())
             sage: G.cvetkovic()
             4
-        """
-        eigenvalues = self.spectrum()
-        positive = 0
-        negative = 0
-        zero = 0
-        for e in eigenvalues:
-            if e > 0:
-                positive += 1
-            elif e < 0:
-                negative += 1
-            else:
-                zero += 1
 
-        return zero + min([positive, negative])
+        The counts come from an exact inertia computation ::
+            sage: G = INPGraph(graphs.RandomGNP(12, 0.4))
+            sage: s = G.spectrum()
+            sage: G._adjacency_inertia() == (len([e for e in s if e > 0]), len([e for e in s if e < 0]), s.count(0))
+            True
+        """
+        (positive, negative, zero) = self._adjacency_inertia()
+        return Integer(zero + min(positive, negative))
     cvetkovic._is_upper_bound = True
+    cvetkovic._reads_spectrum = True
 
     def annihilation_number(self):
         r"""
@@ -1727,13 +4236,19 @@ class INPGraph(Graph):
             3
         """
         seq = sorted(self.degree())
+        total = sum(seq)
 
         a = 0
-        while sum(seq[:a+1]) <= sum(seq[a+1:]):
+        prefix = 0
+        for d in seq:
+            prefix += d
+            if 2 * prefix > total:
+                break
             a += 1
 
         return a
     annihilation_number._is_upper_bound = True
+    annihilation_number._memory = _linear_memory
 
     def borg(self):
         # TODO: Write more tests
@@ -1754,6 +4269,7 @@ class INPGraph(Graph):
 
         return n - ceil((n-1) / Delta)
     borg._is_upper_bound = True
+    borg._memory = _linear_memory
 
     def cut_vertices_bound(self):
         # TODO: Write more tests
@@ -1770,7 +4286,39 @@ class INPGraph(Graph):
         C = Integer(len(self.blocks_and_cut_vertices()[1]))
         return n - C/2 - Integer(1)/2
     cut_vertices_bound._is_upper_bound = True
+    cut_vertices_bound._memory = _linear_memory
 
-    _alpha_properties = [has_magnet, Graph.is_perfect, has_simplicial_vertex, is_forbidden_subgraph_free, has_nonempty_KE_part, is_almost_KE, is_fold_reducible]
-    _lower_bounds = [angel_campigotto_laforest, Graph.radius, Graph.average_distance, five_fourteenths_lower_bound, max_even_minus_even_horizontal, max_odd_minus_odd_horizontal, matching_lower_bound, residue, average_degree_bound, caro_wei, seklow, wilf, hansen_zheng_lower_bound, harant]
+    _alpha_properties = [has_magnet, is_perfect, has_simplicial_vertex, is_forbidden_subgraph_free, has_nonempty_KE_part, is_almost_KE, is_fold_reducible]
+    _lower_bounds = [angel_campigotto_laforest, radius, average_distance, five_fourteenths_lower_bound, max_even_minus_even_horizontal, max_odd_minus_odd_horizontal, matching_lower_bound, residue, average_degree_bound, caro_wei, seklow, wilf, hansen_zheng_lower_bound, harant]
     _upper_bounds = [matching_upper_bound, fractional_alpha, lovasz_theta, kwok, hansen_zheng_upper_bound, min_degree_bound, cvetkovic, annihilation_number, borg, cut_vertices_bound]
+
+# The forbidden patterns of the induced subgraph census. Their lookup tables
+# are only built by _induced_pattern_table when a census first needs them.
+INPGraph._induced_pattern_graphs = [
+    ('p4', graphs.PathGraph(4)),
+    ('claw', graphs.ClawGraph()),
+    ('diamond', graphs.DiamondGraph()),
+    ('chair', INPGraph.ChairGraph()),
+    ('co_chair', INPGraph.CoChairGraph()),
+    ('p5', graphs.PathGraph(5)),
+    ('house', graphs.HouseGraph()),
+    ('p', INPGraph.PGraph()),
+    ('co_p', INPGraph.CoPGraph()),
+    ('gem', INPGraph.GemGraph()),
+    ('bull', graphs.BullGraph()),
+    ('skew_star', INPGraph.SkewStar())
+]
+
+# Results cached per instance refer to the edges and vertex labels, so every
+# mutator drops them. A delete_edge followed by an add_edge, or an in place
+# relabel, keeps the order and size.
+for name in ['add_vertex', 'add_vertices', 'delete_vertex', 'delete_vertices',
+             'add_edge', 'add_edges', 'delete_edge', 'delete_edges',
+             'delete_multiedge', 'remove_loops', 'remove_multiple_edges',
+             'relabel', 'merge_vertices', 'contract_edge', 'contract_edges',
+             'subdivide_edge', 'subdivide_edges', 'add_cycle', 'add_path',
+             'add_clique', 'clear', 'set_edge_label', 'allow_loops',
+             'allow_multiple_edges']:
+    if hasattr(Graph, name):
+        setattr(INPGraph, name, _drops_instance_cache(getattr(Graph, name)))
+del name